@@ -1,19 +1,20 @@
 import os
 from flask import Flask
 from dotenv import load_dotenv
-from extensions import db, login_manager
+from extensions import db, login_manager, configure_database
 from routes import main_bp
-from models import User
+from models import User, upgrade_schema
 
 load_dotenv()
 
 def create_app():
     app = Flask(__name__)
     app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev')
-    app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///health_app.db')
-    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # Shared audio store; tasks only record the file name, so each host
+    # may mount it at its own path
+    app.config['UPLOAD_FOLDER'] = os.getenv('UPLOAD_FOLDER', os.path.join('static', 'uploads'))
     
-    db.init_app(app)
+    configure_database(app)
     login_manager.init_app(app)
     login_manager.login_view = 'main.login'
     
@@ -21,6 +22,7 @@ def create_app():
     
     with app.app_context():
         db.create_all()
+        upgrade_schema()
         
         # Seed Super Admin
         if not User.query.filter_by(username='adminsuper').first():
@@ -32,8 +34,11 @@ def create_app():
             print("Super Admin created.")
             
     # Start Background Worker
-    from services import start_worker
-    start_worker(app)
+    # Set START_WORKER=0 for web-only processes (e.g. several gunicorn
+    # workers) and run worker.py separately instead.
+    if os.getenv('START_WORKER', '1') != '0':
+        from services import start_worker
+        start_worker(app)
         
     return app
 
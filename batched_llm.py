@@ -0,0 +1,231 @@
+import threading
+from concurrent.futures import Future
+import numpy as np
+import llama_cpp
+
+# Batched LLM Inference
+# One llama.cpp context holds several sequences (one KV-cache slot each).
+# Every decode step feeds the next token of all running sequences, plus the
+# prompts of newly admitted ones, in a single llama_decode call, so the CPU
+# works on a batch instead of a single sequence. Requests from any thread
+# (chunks of one task or of different tasks) join the next free slot, and
+# each caller gets its own Future back, so results never get mixed up.
+
+# Sampling defaults match Llama.__call__ so output is comparable
+TEMPERATURE = 0.8
+TOP_K = 40
+TOP_P = 0.95
+MIN_P = 0.05
+
+def llama_fn(*names):
+    # llama-cpp-python renamed several low-level functions between releases
+    for name in names:
+        fn = getattr(llama_cpp, name, None)
+        if fn is not None:
+            return fn
+    raise AttributeError(f"llama_cpp has none of: {', '.join(names)}")
+
+class Sequence:
+    def __init__(self, slot, prompt_tokens, max_tokens, stop, future):
+        self.slot = slot
+        self.pending = list(prompt_tokens)  # tokens still to be decoded
+        self.n_past = 0
+        self.prompt_tokens = len(prompt_tokens)
+        self.max_tokens = max_tokens
+        self.stop = stop
+        self.future = future
+        self.generated = []
+        self.text = b""
+        self.logits_index = -1
+
+class BatchedLLM(threading.Thread):
+    def __init__(self, llm, n_seq=4, seq_ctx=2048, n_threads=4, seed=None):
+        # llm: a loaded Llama, used for its weights and tokenizer only
+        super().__init__()
+        self.daemon = True
+        self.llm = llm
+        self.n_seq = n_seq
+        self.seq_ctx = seq_ctx
+        self.n_batch = seq_ctx
+        self.n_vocab = llm.n_vocab()
+        self.rng = np.random.default_rng(seed)
+
+        params = llama_cpp.llama_context_default_params()
+        params.n_ctx = n_seq * seq_ctx
+        params.n_batch = self.n_batch
+        params.n_seq_max = n_seq
+        params.n_threads = n_threads
+        params.n_threads_batch = n_threads
+        self.ctx = llama_fn('llama_init_from_model', 'llama_new_context_with_model')(llm.model, params)
+        if not self.ctx:
+            raise RuntimeError("Failed to create batched llama.cpp context")
+        self.batch = llama_cpp.llama_batch_init(self.n_batch, 0, n_seq)
+
+        self.init_compat()
+        self.queue = []
+        self.running_seqs = {}
+        self.condition = threading.Condition()
+        self.running = True
+        self.start()
+
+    def init_compat(self):
+        try:
+            memory = llama_cpp.llama_get_memory(self.ctx)
+            seq_rm = llama_cpp.llama_memory_seq_rm
+            self.seq_rm = lambda slot: seq_rm(memory, slot, -1, -1)
+        except AttributeError:
+            seq_rm = llama_fn('llama_kv_self_seq_rm', 'llama_kv_cache_seq_rm')
+            self.seq_rm = lambda slot: seq_rm(self.ctx, slot, -1, -1)
+
+        try:
+            vocab = llama_cpp.llama_model_get_vocab(self.llm.model)
+            self.is_eog = lambda token: llama_cpp.llama_vocab_is_eog(vocab, token)
+        except AttributeError:
+            try:
+                is_eog = llama_cpp.llama_token_is_eog
+                self.is_eog = lambda token: is_eog(self.llm.model, token)
+            except AttributeError:
+                eos = self.llm.token_eos()
+                self.is_eog = lambda token: token == eos
+
+    def tokenize(self, text, add_bos=True, special=False):
+        return self.llm.tokenize(text, add_bos=add_bos, special=special)
+
+    def submit(self, prompt, max_tokens=256, stop=None):
+        future = Future()
+        tokens = self.llm.tokenize(prompt.encode('utf-8'), add_bos=True)
+        max_tokens = min(max_tokens, self.seq_ctx - len(tokens))
+        if max_tokens <= 0:
+            future.set_exception(ValueError(f"Prompt of {len(tokens)} tokens does not fit in {self.seq_ctx}"))
+            return future
+        with self.condition:
+            self.queue.append((tokens, max_tokens, stop or [], future))
+            self.condition.notify()
+        return future
+
+    def __call__(self, prompt, max_tokens=256, stop=None, echo=False):
+        # Same call shape as Llama for single completions
+        return self.submit(prompt, max_tokens=max_tokens, stop=stop).result()
+
+    def close(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        self.join()
+        llama_cpp.llama_batch_free(self.batch)
+        llama_cpp.llama_free(self.ctx)
+        self.ctx = None
+
+    def run(self):
+        while True:
+            with self.condition:
+                while self.running and not self.queue and not self.running_seqs:
+                    self.condition.wait()
+                if not self.running:
+                    break
+                self.admit()
+            try:
+                self.step()
+            except Exception as e:
+                self.fail_all(e)
+
+        self.fail_all(RuntimeError("Batched LLM closed"))
+
+    def admit(self):
+        # Called with the condition held: move queued requests into free slots
+        free_slots = [s for s in range(self.n_seq) if s not in self.running_seqs]
+        budget = self.n_batch - len(self.running_seqs)
+        while self.queue and free_slots:
+            tokens, max_tokens, stop, future = self.queue[0]
+            if len(tokens) > budget and self.running_seqs:
+                break  # prefill it in a later step
+            self.queue.pop(0)
+            if not future.set_running_or_notify_cancel():
+                continue
+            slot = free_slots.pop(0)
+            self.running_seqs[slot] = Sequence(slot, tokens, max_tokens, stop, future)
+            budget -= len(tokens)
+
+    def step(self):
+        batch = self.batch
+        n = 0
+        for seq in self.running_seqs.values():
+            for i, token in enumerate(seq.pending):
+                batch.token[n] = token
+                batch.pos[n] = seq.n_past + i
+                batch.n_seq_id[n] = 1
+                batch.seq_id[n][0] = seq.slot
+                batch.logits[n] = i == len(seq.pending) - 1
+                n += 1
+            seq.n_past += len(seq.pending)
+            seq.logits_index = n - 1
+            seq.pending = []
+        batch.n_tokens = n
+
+        if n == 0:
+            return
+        status = llama_cpp.llama_decode(self.ctx, batch)
+        if status != 0:
+            raise RuntimeError(f"llama_decode failed with status {status}")
+
+        for seq in list(self.running_seqs.values()):
+            logits = np.ctypeslib.as_array(
+                llama_cpp.llama_get_logits_ith(self.ctx, seq.logits_index),
+                shape=(self.n_vocab,)
+            )
+            token = self.sample(logits)
+            if self.is_eog(token):
+                self.finish(seq)
+                continue
+            seq.generated.append(token)
+            seq.text += self.llm.detokenize([token])
+            if self.check_stop(seq) or len(seq.generated) >= seq.max_tokens:
+                self.finish(seq)
+            else:
+                seq.pending = [token]
+
+    def sample(self, logits):
+        # Temperature + top-k + top-p + min-p, as in llama.cpp's default chain
+        top = np.argpartition(logits, -TOP_K)[-TOP_K:]
+        top = top[np.argsort(logits[top])[::-1]]
+        scaled = logits[top].astype(np.float64) / TEMPERATURE
+        probs = np.exp(scaled - scaled.max())
+        probs /= probs.sum()
+        keep = (np.cumsum(probs) - probs < TOP_P) & (probs >= MIN_P * probs[0])
+        probs = probs[keep] / probs[keep].sum()
+        return int(top[keep][self.rng.choice(len(probs), p=probs)])
+
+    def check_stop(self, seq):
+        text = seq.text.decode('utf-8', errors='ignore')
+        hits = [text.find(s) for s in seq.stop if s in text]
+        if hits:
+            seq.text = text[:min(hits)].encode('utf-8')
+            return True
+        return False
+
+    def finish(self, seq):
+        self.seq_rm(seq.slot)
+        with self.condition:
+            del self.running_seqs[seq.slot]
+        seq.future.set_result({
+            'choices': [{'text': seq.text.decode('utf-8', errors='ignore')}],
+            'usage': {
+                'prompt_tokens': seq.prompt_tokens,
+                'completion_tokens': len(seq.generated)
+            }
+        })
+
+    def fail_all(self, error):
+        with self.condition:
+            seqs = list(self.running_seqs.values())
+            self.running_seqs.clear()
+            queued = [] if self.running else self.queue
+            if not self.running:
+                self.queue = []
+        for seq in seqs:
+            if self.ctx:
+                self.seq_rm(seq.slot)
+            seq.future.set_exception(error)
+        for tokens, max_tokens, stop, future in queued:
+            if future.set_running_or_notify_cancel():
+                future.set_exception(error)
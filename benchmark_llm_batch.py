@@ -0,0 +1,94 @@
+import os
+import sys
+import time
+import argparse
+
+# Benchmark: aggregate tokens/sec of batched multi-sequence decoding
+# Runs the same set of dialogue-formatting prompts through BatchedLLM at
+# batch sizes 1..8, plus the sequential Llama.__call__ path used when
+# LLM_BATCH_SIZE=1. Run on the target CPU host to pick LLM_BATCH_SIZE.
+#
+# Usage: python benchmark_llm_batch.py [--requests 16] [--max-tokens 128] [--threads 4]
+
+SAMPLE_TURNS = [
+    "Q: Selamat pagi bu, boleh saya tahu sejak kapan ibu mulai batuk",
+    "A: sudah sekitar tiga minggu pak batuknya tidak berhenti apalagi kalau malam",
+    "Q: apakah ibu sempat periksa ke puskesmas atau rumah sakit sebelumnya",
+    "A: sempat ke puskesmas terus disuruh periksa dahak katanya harus tiga kali",
+    "Q: lalu bagaimana hasilnya bu apakah sudah diberi obat",
+    "A: sudah pak obatnya harus diminum setiap hari selama enam bulan tidak boleh putus",
+    "Q: apa yang paling sulit menurut ibu selama minum obat itu",
+    "A: kadang mual dan pusing jadi malas tapi keluarga selalu mengingatkan",
+]
+
+def build_prompts(count):
+    prompts = []
+    for i in range(count):
+        # Rotate turns so each sequence has different content
+        turns = SAMPLE_TURNS[i % len(SAMPLE_TURNS):] + SAMPLE_TURNS[:i % len(SAMPLE_TURNS)]
+        chunk = "\n\n".join(turns * 2)
+        prompts.append(f"""
+        Rapikan tanda baca dialog wawancara berikut.
+        Jangan mengubah label "Q:" dan "A:" maupun urutan giliran bicara.
+
+        Teks:
+        {chunk}
+
+        Dialog:
+        """)
+    return prompts
+
+def run_sequential(llm, prompts, max_tokens):
+    start = time.perf_counter()
+    tokens = 0
+    for prompt in prompts:
+        output = llm(prompt, max_tokens=max_tokens, stop=["Teks:", "Dialog:"], echo=False)
+        tokens += output['usage']['completion_tokens']
+    return tokens, time.perf_counter() - start
+
+def run_batched(llm, prompts, max_tokens, batch_size, threads):
+    from batched_llm import BatchedLLM
+
+    engine = BatchedLLM(llm, n_seq=batch_size, seq_ctx=2048, n_threads=threads, seed=0)
+    try:
+        start = time.perf_counter()
+        futures = [engine.submit(p, max_tokens=max_tokens, stop=["Teks:", "Dialog:"]) for p in prompts]
+        tokens = sum(f.result()['usage']['completion_tokens'] for f in futures)
+        return tokens, time.perf_counter() - start
+    finally:
+        engine.close()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=16)
+    parser.add_argument('--max-tokens', type=int, default=128)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--max-batch', type=int, default=8)
+    args = parser.parse_args()
+
+    from llama_cpp import Llama
+    from services import LLM_MODEL_PATH
+
+    if not os.path.exists(LLM_MODEL_PATH):
+        print(f"Model not found: {LLM_MODEL_PATH} (run setup_models.py first)")
+        sys.exit(1)
+
+    llm = Llama(model_path=LLM_MODEL_PATH, n_ctx=4096, n_threads=args.threads, use_mmap=True, verbose=False)
+    prompts = build_prompts(args.requests)
+
+    print("="*60)
+    print(f" {args.requests} prompts, max {args.max_tokens} tokens, {args.threads} threads, {os.cpu_count()} CPUs")
+    print("="*60)
+    print(f"{'mode':<22}{'tokens':>10}{'seconds':>10}{'tokens/s':>12}{'speedup':>10}")
+
+    tokens, seconds = run_sequential(llm, prompts, args.max_tokens)
+    baseline = tokens / seconds
+    print(f"{'sequential (__call__)':<22}{tokens:>10}{seconds:>10.1f}{baseline:>12.1f}{1.0:>9.2f}x")
+
+    for batch_size in range(1, args.max_batch + 1):
+        tokens, seconds = run_batched(llm, prompts, args.max_tokens, batch_size, args.threads)
+        rate = tokens / seconds
+        print(f"{f'batched n_seq={batch_size}':<22}{tokens:>10}{seconds:>10.1f}{rate:>12.1f}{rate / baseline:>9.2f}x")
+
+if __name__ == '__main__':
+    main()
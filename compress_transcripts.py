@@ -0,0 +1,110 @@
+import os
+import sys
+import time
+import random
+from sqlalchemy import func
+
+# Migration: compress existing transcripts
+# Moves rows from the legacy uncompressed `content` column into
+# `content_blob`, training a zstd dictionary on the transcripts first when
+# zstandard is installed. Safe to re-run; already compressed rows are
+# skipped unless --retrain is given.
+#
+# Usage: python compress_transcripts.py [--retrain] [--vacuum]
+
+BATCH_SIZE = 50
+DICTIONARY_SAMPLES = 1000
+LATENCY_SAMPLES = 50
+
+def main():
+    retrain = '--retrain' in sys.argv
+    vacuum = '--vacuum' in sys.argv
+
+    from worker import create_worker_app
+    from extensions import db
+    from models import Transcript, CompressionDictionary, active_dictionary
+    from compression import train_dictionary, zstandard
+
+    # create_worker_app() also adds the new columns/tables to old databases
+    app = create_worker_app()
+    with app.app_context():
+        print("="*50)
+        print(" KOMPRESI TRANSKRIP ")
+        print("="*50)
+        print("Codec:", "zstd" if zstandard else "zlib (install zstandard for better ratios)")
+
+        # 1. Train dictionary
+        if zstandard and (retrain or not active_dictionary()):
+            ids = [row.id for row in db.session.query(Transcript.id).all()]
+            sample_ids = random.sample(ids, min(len(ids), DICTIONARY_SAMPLES))
+            samples = [Transcript.query.get(i).content for i in sample_ids]
+            db.session.expunge_all()
+            data = train_dictionary(samples)
+            if data:
+                db.session.add(CompressionDictionary(data=data))
+                db.session.commit()
+                print(f"Dictionary trained on {len(samples)} transcripts ({len(data) / 1024:.0f} KB)")
+            else:
+                print("Not enough transcripts to train a dictionary; compressing without one")
+
+        # 2. Compress rows
+        query = db.session.query(Transcript.id)
+        if not retrain:
+            query = query.filter(Transcript.content_blob.is_(None), Transcript.content_text.isnot(None))
+        ids = [row.id for row in query.order_by(Transcript.id).all()]
+
+        raw_bytes = 0
+        compressed_bytes = 0
+        for start in range(0, len(ids), BATCH_SIZE):
+            for transcript in Transcript.query.filter(Transcript.id.in_(ids[start:start + BATCH_SIZE])).all():
+                content = transcript.content
+                if content is None:
+                    continue
+                transcript.content = content
+                raw_bytes += len(content.encode('utf-8'))
+                compressed_bytes += len(transcript.content_blob)
+            db.session.commit()
+            db.session.expunge_all()
+            print(f"Compressed {min(start + BATCH_SIZE, len(ids))}/{len(ids)}")
+
+        # 3. Report
+        print("-"*50)
+        if raw_bytes:
+            print(f"Migrated rows: {raw_bytes / 1024:.0f} KB -> {compressed_bytes / 1024:.0f} KB "
+                  f"({100 * (1 - compressed_bytes / raw_bytes):.1f}% smaller, {raw_bytes / compressed_bytes:.1f}x)")
+        else:
+            print("No rows needed compressing.")
+
+        total_blob = db.session.query(func.coalesce(func.sum(func.length(Transcript.content_blob)), 0)).scalar()
+        print(f"All compressed transcripts: {total_blob / 1024:.0f} KB")
+
+        # Read latency: the only added cost on access is decompression
+        ids = [row.id for row in db.session.query(Transcript.id).filter(Transcript.content_blob.isnot(None)).all()]
+        sample_ids = random.sample(ids, min(len(ids), LATENCY_SAMPLES))
+        if sample_ids:
+            rows = [Transcript.query.get(i) for i in sample_ids]
+            blob_bytes = sum(len(row.content_blob) for row in rows)
+            
+            start = time.perf_counter()
+            text_bytes = sum(len(row.content.encode('utf-8')) for row in rows)
+            decompress_ms = (time.perf_counter() - start) * 1000 / len(rows)
+            
+            print(f"Read latency: +{decompress_ms:.3f} ms per transcript to decompress "
+                  f"(avg {blob_bytes / len(rows) / 1024:.1f} KB read instead of {text_bytes / len(rows) / 1024:.1f} KB)")
+
+        # 4. Reclaim space
+        if vacuum and db.engine.dialect.name == 'sqlite':
+            db_path = db.engine.url.database
+            before = os.path.getsize(db_path)
+            db.session.close()
+            with db.engine.connect() as conn:
+                conn.exec_driver_sql('VACUUM')
+                # With WAL the rewritten pages land in the -wal file first
+                conn.exec_driver_sql('PRAGMA wal_checkpoint(TRUNCATE)')
+            after = os.path.getsize(db_path)
+            print(f"Database file: {before / 1024:.0f} KB -> {after / 1024:.0f} KB")
+        elif db.engine.dialect.name == 'sqlite':
+            print("Run with --vacuum to shrink the SQLite file.")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+import zlib
+import struct
+import threading
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Compressed Text Storage
+# Blobs start with a one-byte codec tag so old and new formats can live in
+# the same column:
+#   b'z' + zlib stream
+#   b's' + 4-byte dictionary id (0 = no dictionary) + zstd frame
+# zstd (optional dependency) is used when installed; a dictionary trained on
+# our own transcripts makes even short transcripts compress well.
+
+CODEC_ZLIB = b'z'
+CODEC_ZSTD = b's'
+ZLIB_LEVEL = 9
+ZSTD_LEVEL = 12
+DICTIONARY_SIZE = 112 * 1024
+
+dictionary_cache = {}
+dictionary_cache_lock = threading.Lock()
+
+def zstd_dictionary(dict_id, load):
+    # Dictionaries never change once stored, so load each id only once
+    with dictionary_cache_lock:
+        if dict_id not in dictionary_cache:
+            dictionary_cache[dict_id] = zstandard.ZstdCompressionDict(load(dict_id))
+        return dictionary_cache[dict_id]
+
+def compress_text(text, dictionary=None):
+    # dictionary: optional (dict_id, bytes) pair, only used with zstd
+    if text is None:
+        return None
+    data = text.encode('utf-8')
+
+    if zstandard is None:
+        return CODEC_ZLIB + zlib.compress(data, ZLIB_LEVEL)
+
+    if dictionary:
+        dict_id, dict_data = dictionary
+        compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL, dict_data=zstd_dictionary(dict_id, lambda _: dict_data))
+    else:
+        dict_id = 0
+        compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL)
+    return CODEC_ZSTD + struct.pack('>I', dict_id) + compressor.compress(data)
+
+def decompress_bytes(blob, load_dictionary=None, max_bytes=None):
+    # load_dictionary(dict_id) -> bytes, called only for dictionary blobs.
+    # max_bytes stops once that much output is available.
+    blob = bytes(blob)
+    codec = blob[:1]
+
+    if codec == CODEC_ZLIB:
+        if max_bytes is None:
+            return zlib.decompress(blob[1:])
+        return zlib.decompressobj().decompress(blob[1:], max_bytes)
+
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise RuntimeError("Transcript is zstd-compressed but the zstandard package is not installed")
+        dict_id = struct.unpack('>I', blob[1:5])[0]
+        if dict_id:
+            decompressor = zstandard.ZstdDecompressor(dict_data=zstd_dictionary(dict_id, load_dictionary))
+        else:
+            decompressor = zstandard.ZstdDecompressor()
+        if max_bytes is None:
+            return decompressor.decompress(blob[5:])
+        with decompressor.stream_reader(blob[5:]) as reader:
+            return reader.read(max_bytes)
+
+    raise ValueError(f"Unknown compression codec: {codec!r}")
+
+def decompress_text(blob, load_dictionary=None):
+    if blob is None:
+        return None
+    return decompress_bytes(blob, load_dictionary).decode('utf-8')
+
+def decompress_preview(blob, max_chars, load_dictionary=None):
+    # Decompresses only the start of the text. UTF-8 needs at most 4 bytes
+    # per character; a character cut in half at the end is dropped.
+    if blob is None:
+        return None
+    data = decompress_bytes(blob, load_dictionary, max_bytes=4 * max_chars)
+    return data.decode('utf-8', errors='ignore')[:max_chars]
+
+def train_dictionary(samples, size=DICTIONARY_SIZE):
+    # Returns dictionary bytes, or None if zstd is unavailable or there is
+    # too little data to train on
+    if zstandard is None:
+        return None
+    samples = [s.encode('utf-8') for s in samples if s]
+    if len(samples) < 10:
+        return None
+    # A dictionary larger than the training data is useless
+    size = min(size, sum(len(s) for s in samples) // 10)
+    try:
+        return zstandard.train_dictionary(size, samples).as_bytes()
+    except zstandard.ZstdError as e:
+        print(f"Dictionary training failed: {e}")
+        return None
@@ -0,0 +1,170 @@
+import numpy as np
+from faster_whisper.audio import decode_audio
+
+# Speaker Diarization (CPU)
+# Each Whisper segment gets a speaker embedding built from log-mel
+# statistics, then segments are clustered into speakers with a vectorized
+# k-means on the unit sphere. The interviewer ("Q") is the speaker who asks
+# the most questions, so the LLM no longer has to guess the labels.
+
+SAMPLE_RATE = 16000
+FRAME_LENGTH = 400   # 25 ms
+HOP_LENGTH = 160     # 10 ms
+N_FFT = 512
+N_MELS = 40
+MIN_SEGMENT_FRAMES = 30  # ~0.3 s, shorter segments inherit a neighbour's label
+FRAME_BLOCK = 8192
+KMEANS_ITERATIONS = 50
+
+
+def mel_filterbank(sample_rate=SAMPLE_RATE, n_fft=N_FFT, n_mels=N_MELS):
+    def hz_to_mel(hz):
+        return 2595.0 * np.log10(1.0 + hz / 700.0)
+
+    def mel_to_hz(mel):
+        return 700.0 * (10.0 ** (mel / 2595.0) - 1.0)
+
+    mel_points = np.linspace(hz_to_mel(0.0), hz_to_mel(sample_rate / 2), n_mels + 2)
+    bins = np.floor((n_fft + 1) * mel_to_hz(mel_points) / sample_rate).astype(int)
+
+    fbank = np.zeros((n_mels, n_fft // 2 + 1), dtype=np.float32)
+    for m in range(1, n_mels + 1):
+        left, center, right = bins[m - 1], bins[m], bins[m + 1]
+        if center > left:
+            fbank[m - 1, left:center] = (np.arange(left, center) - left) / (center - left)
+        if right > center:
+            fbank[m - 1, center:right] = (right - np.arange(center, right)) / (right - center)
+    return fbank
+
+
+def log_mel_frames(audio):
+    # Frame the whole recording once; segments are sliced from the result.
+    if len(audio) < FRAME_LENGTH:
+        audio = np.pad(audio, (0, FRAME_LENGTH - len(audio)))
+    n_frames = 1 + (len(audio) - FRAME_LENGTH) // HOP_LENGTH
+    frames = np.lib.stride_tricks.as_strided(
+        audio,
+        shape=(n_frames, FRAME_LENGTH),
+        strides=(audio.strides[0] * HOP_LENGTH, audio.strides[0]),
+        writeable=False
+    )
+    window = np.hamming(FRAME_LENGTH).astype(np.float32)
+    fbank = mel_filterbank().T
+
+    # Blocked so an hour-long interview does not need the full spectrogram in RAM
+    features = np.empty((n_frames, N_MELS), dtype=np.float32)
+    for start in range(0, n_frames, FRAME_BLOCK):
+        block = frames[start:start + FRAME_BLOCK] * window
+        spectrum = np.abs(np.fft.rfft(block, n=N_FFT)) ** 2
+        features[start:start + FRAME_BLOCK] = np.log(spectrum @ fbank + 1e-6)
+    return features
+
+
+def segment_embeddings(features, segments):
+    # Mean + std of log-mel energies per segment, with cepstral mean
+    # normalisation over the recording so the channel does not dominate.
+    features = features - features.mean(axis=0)
+    embeddings = np.zeros((len(segments), 2 * features.shape[1]), dtype=np.float32)
+    valid = np.zeros(len(segments), dtype=bool)
+
+    for i, segment in enumerate(segments):
+        start = int(segment['start'] * SAMPLE_RATE / HOP_LENGTH)
+        end = int(segment['end'] * SAMPLE_RATE / HOP_LENGTH)
+        window = features[start:end]
+        if len(window) < MIN_SEGMENT_FRAMES:
+            continue
+        embeddings[i] = np.concatenate([window.mean(axis=0), window.std(axis=0)])
+        valid[i] = True
+
+    if valid.any():
+        embeddings[valid] -= embeddings[valid].mean(axis=0)
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    embeddings = np.divide(embeddings, norms, out=np.zeros_like(embeddings), where=norms > 0)
+    return embeddings, valid
+
+
+def cluster_embeddings(embeddings, num_speakers=2, weights=None):
+    # Spherical k-means: all distances are computed as one matrix product.
+    n = len(embeddings)
+    if n <= num_speakers:
+        return np.arange(n)
+    if weights is None:
+        weights = np.ones(n, dtype=np.float32)
+
+    # Deterministic farthest-point initialisation
+    centroids = [embeddings[np.argmax(weights)]]
+    for _ in range(1, num_speakers):
+        similarity = embeddings @ np.stack(centroids).T
+        centroids.append(embeddings[np.argmin(similarity.max(axis=1))])
+    centroids = np.stack(centroids)
+
+    labels = np.zeros(n, dtype=int)
+    for iteration in range(KMEANS_ITERATIONS):
+        new_labels = np.argmax(embeddings @ centroids.T, axis=1)
+        if iteration > 0 and np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+        one_hot = np.eye(num_speakers, dtype=np.float32)[labels] * weights[:, None]
+        sums = one_hot.T @ embeddings
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        centroids = np.where(norms > 0, sums / np.maximum(norms, 1e-9), centroids)
+    return labels
+
+
+def assign_roles(segments, labels):
+    # Interviewer = speaker with most questions; tie goes to whoever speaks first.
+    questions = {}
+    for segment, label in zip(segments, labels):
+        questions[label] = questions.get(label, 0) + segment['text'].strip().endswith('?')
+    first = labels[0]
+    interviewer = max(questions, key=lambda label: (questions[label], label == first))
+    return ['Q' if label == interviewer else 'A' for label in labels]
+
+
+def fill_short_labels(labels):
+    # Segments too short to embed (label -1) take the previous label, or the
+    # next one at the start; with no labels at all everything is speaker 0
+    labels = labels.copy()
+    for i in range(1, len(labels)):
+        if labels[i] < 0:
+            labels[i] = labels[i - 1]
+    for i in range(len(labels) - 2, -1, -1):
+        if labels[i] < 0:
+            labels[i] = labels[i + 1]
+    labels[labels < 0] = 0
+    return labels
+
+
+def diarize_segments(audio_path, segments, num_speakers=2):
+    """Label Whisper segments with "Q"/"A" and merge them into speaker turns."""
+    segments = [s for s in segments if s['text'].strip()]
+    if not segments:
+        return []
+
+    audio = decode_audio(audio_path, sampling_rate=SAMPLE_RATE)
+    embeddings, valid = segment_embeddings(log_mel_frames(audio), segments)
+
+    labels = np.full(len(segments), -1, dtype=int)
+    if valid.any():
+        durations = np.array([s['end'] - s['start'] for s in segments], dtype=np.float32)
+        labels[valid] = cluster_embeddings(embeddings[valid], num_speakers, durations[valid])
+
+    labels = fill_short_labels(labels)
+
+    turns = []
+    for segment, role in zip(segments, assign_roles(segments, labels)):
+        if turns and turns[-1]['speaker'] == role:
+            turns[-1]['text'] += " " + segment['text'].strip()
+            turns[-1]['end'] = segment['end']
+        else:
+            turns.append({
+                'speaker': role,
+                'start': segment['start'],
+                'end': segment['end'],
+                'text': segment['text'].strip()
+            })
+    return turns
+
+
+def format_turns(turns):
+    return "\n\n".join(f"{turn['speaker']}: {turn['text']}" for turn in turns)
@@ -1,5 +1,61 @@
+import os
+import sqlite3
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
 
 db = SQLAlchemy()
 login_manager = LoginManager()
+
+# SQLite tuning: WAL lets status polls read while the worker writes, and the
+# busy timeout makes writers wait for the lock instead of failing with
+# "database is locked".
+# WAL relies on shared memory, so it only works for processes on one host
+# with the database on a local disk; multi-host setups must use Postgres.
+def sqlite_busy_timeout_ms():
+    # Read lazily so values from .env (loaded after imports) are honoured
+    return int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '30000'))
+
+def configure_database(app):
+    # Sets the URI and engine/pool options, then binds db to the app.
+    url = os.getenv('DATABASE_URL', 'sqlite:///health_app.db')
+    if url.startswith('postgres://'):
+        # Heroku-style URLs are not accepted by SQLAlchemy
+        url = url.replace('postgres://', 'postgresql://', 1)
+    app.config['SQLALCHEMY_DATABASE_URI'] = url
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+
+    if url.startswith('sqlite'):
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+            'connect_args': {
+                'timeout': sqlite_busy_timeout_ms() / 1000,
+                # Worker and heartbeat threads use their own sessions, but
+                # pooled connections may be handed to a different thread
+                'check_same_thread': False
+            }
+        }
+    else:
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+            'pool_size': int(os.getenv('DB_POOL_SIZE', '5')),
+            'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', '10')),
+            'pool_timeout': int(os.getenv('DB_POOL_TIMEOUT', '30')),
+            # Drop connections the server closed while idle
+            'pool_pre_ping': True,
+            'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', '1800'))
+        }
+
+    db.init_app(app)
+
+@event.listens_for(Engine, 'connect')
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute(f'PRAGMA busy_timeout={sqlite_busy_timeout_ms()}')
+    # Safe with WAL; only the last commits can be lost on power failure
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.execute('PRAGMA temp_store=MEMORY')
+    cursor.execute('PRAGMA cache_size=-16000')
+    cursor.close()
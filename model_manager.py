@@ -0,0 +1,220 @@
+import os
+import gc
+import time
+import threading
+from contextlib import contextmanager
+
+# Model Manager
+# Loads models on demand under a RAM budget, unloads models that sat idle
+# for too long and evicts the least recently used idle model when a new one
+# does not fit. GGUF weights are memory-mapped read-only by llama.cpp, so
+# every worker process on a host shares one copy in the page cache.
+
+MB = 1024 * 1024
+
+def current_rss():
+    # Resident set size of this process in bytes, or None if unknown
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+def mapped_rss(path):
+    # Resident bytes of a memory-mapped file in this process (Linux only).
+    # Pages are shared with other processes mapping the same file.
+    try:
+        real_path = os.path.realpath(path)
+        total = 0
+        in_mapping = False
+        with open('/proc/self/smaps') as f:
+            for line in f:
+                fields = line.split()
+                if '-' in fields[0] and not fields[0].endswith(':'):
+                    in_mapping = len(fields) >= 6 and fields[-1] == real_path
+                elif in_mapping and fields[0] == 'Rss:':
+                    total += int(fields[1]) * 1024
+        return total
+    except OSError:
+        return None
+
+def path_size(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for root, dirs, files in os.walk(path):
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+    return total
+
+class ManagedModel:
+    def __init__(self, name, loader, estimated_bytes, lock, unloader=None, mapped_path=None):
+        self.name = name
+        self.loader = loader
+        self.unloader = unloader
+        self.estimated_bytes = estimated_bytes
+        self.mapped_path = mapped_path
+        self.instance = None
+        self.loaded = False
+        self.loading = False
+        # Callers of this model wait here while another thread loads it
+        self.condition = threading.Condition(lock)
+        self.resident_bytes = 0
+        self.last_used = 0.0
+        self.in_use = 0
+        self.loads = 0
+        self.evictions = 0
+
+    def budget_bytes(self):
+        return max(self.estimated_bytes, self.resident_bytes)
+
+class ModelManager:
+    def __init__(self, budget_bytes=0, idle_timeout=0):
+        # budget_bytes / idle_timeout of 0 disable the limit / idle unloading
+        self.budget_bytes = budget_bytes
+        self.idle_timeout = idle_timeout
+        self.models = {}
+        self.lock = threading.RLock()
+        self.reaper = None
+
+    def register(self, name, loader, estimated_bytes, unloader=None, mapped_path=None):
+        with self.lock:
+            if name not in self.models:
+                self.models[name] = ManagedModel(name, loader, estimated_bytes, self.lock, unloader, mapped_path)
+        self.start_reaper()
+
+    @contextmanager
+    def use(self, name):
+        # Pins the model while in use so it cannot be evicted mid-inference.
+        # Yields None if the model is not registered or failed to load.
+        # Loading happens outside the manager lock, so a slow load (or a
+        # model download) never blocks users of other models or stats().
+        with self.lock:
+            model = self.models.get(name)
+            if model is None:
+                must_load = False
+            else:
+                while model.loading:
+                    model.condition.wait()
+                must_load = not model.loaded
+                if must_load:
+                    self.make_room(model.budget_bytes(), exclude=model)
+                    model.loading = True
+                model.in_use += 1
+                model.last_used = time.monotonic()
+        if model is None:
+            yield None
+            return
+        try:
+            if must_load:
+                try:
+                    self.load(model)
+                finally:
+                    with self.lock:
+                        model.loading = False
+                        model.condition.notify_all()
+            yield model.instance
+        finally:
+            with self.lock:
+                model.in_use -= 1
+                model.last_used = time.monotonic()
+
+    def load(self, model):
+        # Called without the manager lock; only one thread loads a given model.
+        # The RSS delta is approximate if two different models load at once.
+        print(f"Loading {model.name} model...")
+        rss_before = current_rss()
+        instance = model.loader()
+        rss_after = current_rss()
+        with self.lock:
+            model.instance = instance
+            model.loaded = True
+            model.loads += 1
+            if rss_before is not None and rss_after is not None:
+                model.resident_bytes = max(0, rss_after - rss_before)
+        print(f"Loaded {model.name} ({model.resident_bytes / MB:.0f} MB resident, load #{model.loads})")
+
+    def unload(self, model, reason):
+        print(f"Unloading {model.name} model ({reason})...")
+        if model.unloader and model.instance is not None:
+            try:
+                model.unloader(model.instance)
+            except Exception as e:
+                print(f"Failed to close {model.name}: {e}")
+        model.instance = None
+        model.loaded = False
+        model.resident_bytes = 0
+        model.evictions += 1
+        gc.collect()
+
+    def used_bytes(self):
+        # Models still loading already count against the budget
+        return sum(m.budget_bytes() for m in self.models.values() if m.loaded or m.loading)
+
+    def make_room(self, needed_bytes, exclude=None):
+        # Evict least recently used idle models until the new one fits.
+        # Models that are in use are never evicted, so the budget is a soft
+        # limit when a single task needs more than it allows.
+        if not self.budget_bytes:
+            return
+        idle = sorted(
+            (m for m in self.models.values() if m.loaded and not m.in_use and m is not exclude),
+            key=lambda m: m.last_used
+        )
+        for model in idle:
+            if self.used_bytes() + needed_bytes <= self.budget_bytes:
+                break
+            self.unload(model, "memory budget")
+
+    def unload_idle(self):
+        if not self.idle_timeout:
+            return
+        now = time.monotonic()
+        with self.lock:
+            for model in self.models.values():
+                if model.loaded and not model.in_use and now - model.last_used > self.idle_timeout:
+                    self.unload(model, f"idle > {self.idle_timeout}s")
+
+    def start_reaper(self):
+        if not self.idle_timeout or self.reaper is not None:
+            return
+
+        def reap():
+            while True:
+                time.sleep(min(60, self.idle_timeout))
+                self.unload_idle()
+
+        self.reaper = threading.Thread(target=reap, daemon=True)
+        self.reaper.start()
+
+    def stats(self):
+        with self.lock:
+            models = {}
+            for model in self.models.values():
+                resident = model.resident_bytes
+                if model.loaded and model.mapped_path:
+                    # Page-cache pages are faulted in lazily after load
+                    mapped = mapped_rss(model.mapped_path)
+                    if mapped is not None:
+                        resident = max(resident, mapped)
+                models[model.name] = {
+                    'loaded': model.loaded,
+                    'loading': model.loading,
+                    'in_use': model.in_use > 0,
+                    'resident_mb': round(resident / MB, 1) if model.loaded else 0,
+                    'budget_mb': round(model.budget_bytes() / MB, 1),
+                    'loads': model.loads,
+                    'evictions': model.evictions,
+                    'idle_seconds': round(time.monotonic() - model.last_used) if model.loaded else None
+                }
+            return {
+                'budget_mb': round(self.budget_bytes / MB, 1) if self.budget_bytes else None,
+                'used_mb': round(self.used_bytes() / MB, 1),
+                'process_rss_mb': round((current_rss() or 0) / MB, 1),
+                'models': models
+            }
@@ -1,7 +1,9 @@
 from datetime import datetime
 from flask_login import UserMixin
+from sqlalchemy import inspect, text
 from werkzeug.security import generate_password_hash, check_password_hash
 from extensions import db
+from compression import compress_text, decompress_text, decompress_preview, zstandard
 
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -26,10 +28,41 @@ class Transcript(db.Model):
     participant_age = db.Column(db.String(20))
     participant_education = db.Column(db.String(50))
     
-    content = db.Column(db.Text, nullable=True) # The dialogue
+    # The dialogue, stored compressed in content_blob. content_text is the
+    # legacy uncompressed column, only set on rows not yet migrated by
+    # compress_transcripts.py. Both are deferred so listings never load them.
+    content_text = db.deferred(db.Column('content', db.Text, nullable=True))
+    content_blob = db.deferred(db.Column(db.LargeBinary, nullable=True))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     user = db.relationship('User', backref=db.backref('transcripts', lazy=True))
+    
+    @property
+    def content(self):
+        # Decompressed only when actually accessed
+        if self.content_blob is not None:
+            return decompress_text(self.content_blob, load_dictionary)
+        return self.content_text
+    
+    @content.setter
+    def content(self, value):
+        self.content_blob = compress_text(value, active_dictionary())
+        self.content_text = None
+    
+    def preview(self, max_chars):
+        # First max_chars characters, without decompressing the whole body
+        if self.content_blob is not None:
+            return decompress_preview(self.content_blob, max_chars, load_dictionary)
+        if self.content_text is not None:
+            return self.content_text[:max_chars]
+        return None
+
+class CompressionDictionary(db.Model):
+    # zstd dictionaries trained on our transcripts; the newest one is used
+    # for new rows, older ones stay for rows compressed with them
+    id = db.Column(db.Integer, primary_key=True)
+    data = db.Column(db.LargeBinary, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 class TranscriptionTask(db.Model):
     id = db.Column(db.String(36), primary_key=True) # UUID
@@ -42,5 +75,42 @@ class TranscriptionTask(db.Model):
     result_id = db.Column(db.Integer, db.ForeignKey('transcript.id'), nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    # Queue / lease fields: workers claim rows instead of reading a memory queue.
+    # The audio file is found via `filename` inside each worker's UPLOAD_FOLDER.
+    worker_id = db.Column(db.String(100), nullable=True)
+    lease_expires_at = db.Column(db.DateTime, nullable=True)
+    heartbeat_at = db.Column(db.DateTime, nullable=True)
+    attempts = db.Column(db.Integer, default=0)
+    
     user = db.relationship('User', backref=db.backref('tasks', lazy=True))
     transcript = db.relationship('Transcript', backref=db.backref('task', uselist=False))
+
+def load_dictionary(dict_id):
+    return CompressionDictionary.query.get(dict_id).data
+
+def active_dictionary():
+    # Must be called within an app context. Returns (id, bytes) or None.
+    if zstandard is None:
+        return None
+    latest = CompressionDictionary.query.order_by(CompressionDictionary.id.desc()).first()
+    if not latest:
+        return None
+    return latest.id, latest.data
+
+def upgrade_schema():
+    # db.create_all() never alters existing tables, so add any new columns here.
+    # Must be called within an app context.
+    inspector = inspect(db.engine)
+    existing_tables = inspector.get_table_names()
+    
+    with db.engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing = {c['name'] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                column_type = column.type.compile(dialect=db.engine.dialect)
+                print(f"Adding column {table.name}.{column.name}...")
+                conn.execute(text(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}'))
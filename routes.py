@@ -1,12 +1,12 @@
 import os
 import json
 import io
-from flask import Blueprint, render_template, redirect, url_for, request, flash, jsonify, session, send_file
+from flask import Blueprint, render_template, redirect, url_for, request, flash, jsonify, session, send_file, current_app
 from flask_login import login_user, logout_user, login_required, current_user
 from werkzeug.utils import secure_filename
 from extensions import db
 from models import User, Transcript, TranscriptionTask
-from services import add_task, get_task_status, generate_docx
+from services import add_task, get_task_status, generate_docx, get_model_stats
 
 main_bp = Blueprint('main', __name__)
 
@@ -98,8 +98,9 @@ def api_transcribe():
     
     # Save to persistent storage for background processing
     filename = secure_filename(f"{current_user.id}_{audio_file.filename}")
-    filepath = os.path.join('static', 'uploads', filename)
-    os.makedirs(os.path.join('static', 'uploads'), exist_ok=True)
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    filepath = os.path.join(upload_folder, filename)
+    os.makedirs(upload_folder, exist_ok=True)
     audio_file.save(filepath)
     
     # Queue Task
@@ -171,6 +172,16 @@ def upgrade_user(user_id):
     
     return redirect(url_for('main.admin_dashboard'))
 
+@main_bp.route('/admin/models')
+@login_required
+def model_stats():
+    # Only reflects models loaded by this process's in-app worker;
+    # standalone worker.py processes log their stats after each task
+    if current_user.role != 'admin_iii':
+        return jsonify({'error': 'Unauthorized'}), 403
+        
+    return jsonify(get_model_stats())
+
 @main_bp.route('/admin/download/<int:transcript_id>')
 @login_required
 def download_transcript(transcript_id):
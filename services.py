@@ -1,130 +1,368 @@
 import os
 import io
+import re
 import json
 import traceback
 import threading
-import queue
+import contextlib
+import socket
 import uuid
 import time
 import math
-from datetime import datetime
+from datetime import datetime, timedelta
 from faster_whisper import WhisperModel
 from llama_cpp import Llama
 from docx import Document
 from extensions import db
 from models import Transcript, User, TranscriptionTask
+from diarization import diarize_segments, format_turns
+from model_manager import ModelManager, path_size, MB
+from batched_llm import BatchedLLM
 
-# Global model instances
-whisper_model = None
-llm_model = None
+# Models are loaded on demand by the manager instead of staying resident.
+# MODEL_MEMORY_BUDGET_MB=0 disables the budget, MODEL_IDLE_TIMEOUT=0 keeps
+# loaded models forever.
 MODEL_FILENAME = "Llama-3.2-3B-Instruct-Q4_K_M.gguf"
+WHISPER_MODEL_PATH = "models/whisper-medium"
+LLM_MODEL_PATH = f"models/{MODEL_FILENAME}"
+LLM_CONTEXT_MB = 512  # KV cache + scratch buffers for n_ctx=4096
+
+# LLM_BATCH_SIZE > 1 decodes up to that many chunks together in one
+# multi-sequence context (see benchmark_llm_batch.py). Chunks of different
+# tasks only share a batch when WORKER_THREADS > 1.
+LLM_BATCH_SIZE = int(os.getenv('LLM_BATCH_SIZE', '1'))
+LLM_BATCH_SEQ_CTX = 2048  # per sequence: ~700 prompt + up to 1024 output tokens
+LLM_KV_BYTES_PER_TOKEN = 112 * 1024  # f16 KV cache, Llama 3.2 3B
+WORKER_THREADS = int(os.getenv('WORKER_THREADS', '1'))
+
+# A plain Llama is not thread-safe, so with WORKER_THREADS > 1 and no
+# batching, calls from the worker threads take turns on it
+sequential_llm_lock = threading.Lock()
+
+def llm_lock(llm_model):
+    # BatchedLLM already serializes decoding on its own thread
+    if isinstance(llm_model, BatchedLLM):
+        return contextlib.nullcontext()
+    return sequential_llm_lock
+
+model_manager = ModelManager(
+    budget_bytes=int(os.getenv('MODEL_MEMORY_BUDGET_MB', '6144')) * MB,
+    idle_timeout=int(os.getenv('MODEL_IDLE_TIMEOUT', '900'))
+)
+
+# Diarization labels speakers before formatting; set SKIP_LLM_FORMAT=1 to
+# use the labeled turns with Whisper punctuation as-is.
+DIARIZATION_ENABLED = os.getenv('DIARIZATION', '1') != '0'
+SKIP_LLM_FORMAT = os.getenv('SKIP_LLM_FORMAT', '0') == '1'
 
 # Task Queue System
-# We still use a memory queue for the worker to pick up jobs, 
-# but the STATE is stored in the DB.
-task_queue = queue.Queue()
+# The TranscriptionTask table IS the queue. Workers (threads in the web app
+# or standalone worker.py processes on other hosts) atomically claim a row
+# with a lease, keep it alive with heartbeats, and expired leases are
+# reclaimed by any worker.
+LEASE_SECONDS = int(os.getenv('TASK_LEASE_SECONDS', '120'))
+HEARTBEAT_SECONDS = max(1, LEASE_SECONDS // 4)
+MAX_ATTEMPTS = int(os.getenv('TASK_MAX_ATTEMPTS', '3'))
+POLL_INTERVAL = float(os.getenv('TASK_POLL_INTERVAL', '1'))
+
+class LeaseLost(Exception):
+    pass
+
+class LeaseHeartbeat(threading.Thread):
+    def __init__(self, app, task_id, worker_id):
+        super().__init__()
+        self.daemon = True
+        self.app = app
+        self.task_id = task_id
+        self.worker_id = worker_id
+        self.lost = False
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(HEARTBEAT_SECONDS):
+            with self.app.app_context():
+                try:
+                    if not renew_lease(self.task_id, self.worker_id):
+                        print(f"Lease lost for task {self.task_id}")
+                        self.lost = True
+                        return
+                except Exception as e:
+                    print(f"Heartbeat failed: {e}")
+
+    def stop(self):
+        self.stopped.set()
 
 class BackgroundWorker(threading.Thread):
-    def __init__(self, app):
+    def __init__(self, app, worker_id=None):
         super().__init__()
         self.daemon = True
         self.running = True
         self.app = app
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.heartbeat = None
 
     def run(self):
-        print("Background Worker Started")
+        print(f"Background Worker Started ({self.worker_id})")
         load_models()
         
         while self.running:
             try:
-                task_data = task_queue.get(timeout=1)
-                task_id = task_data['id']
-                audio_path = task_data['audio_path']
-                
+                # One app context (and so one scoped session) per poll/task;
+                # the session is removed when the context is torn down
                 with self.app.app_context():
-                    try:
-                        # Update status to processing
-                        update_task_status(task_id, "processing", 0, "Memulai proses...")
-                        
-                        # 1. Transcribe
-                        update_task_status(task_id, "processing", 10, "Mentranskripsi audio...")
-                        raw_transcript = transcribe_audio(audio_path)
-                        
-                        # 2. Format Dialogue (Chunked)
-                        update_task_status(task_id, "processing", 40, "Memformat dialog...")
-                        formatted_content = format_dialogue_chunked(raw_transcript, task_id)
-                        
-                        # 3. Extract Metadata
-                        update_task_status(task_id, "processing", 80, "Mengekstrak informasi...")
-                        metadata = extract_metadata_from_transcript(formatted_content)
-                        
-                        # 4. Save to DB (Transcript)
-                        task = TranscriptionTask.query.get(task_id)
-                        if task:
-                            new_transcript = Transcript(
-                                user_id=task.user_id,
-                                filename=os.path.basename(audio_path),
-                                participant_code=metadata.get('participant_code', '-'),
-                                participant_name=metadata.get('participant_name', '-'),
-                                participant_age=metadata.get('participant_age', '-'),
-                                participant_education=metadata.get('participant_education', '-'),
-                                content=formatted_content
-                            )
-                            db.session.add(new_transcript)
-                            db.session.commit()
-                            
-                            # Update Task to Completed
-                            task.status = 'completed'
-                            task.progress = 100
-                            task.message = 'Selesai'
-                            task.result_id = new_transcript.id
-                            db.session.commit()
-                            
-                            # Clean up file
-                            if os.path.exists(audio_path):
-                                os.remove(audio_path)
-                        
-                    except Exception as e:
-                        print(f"Task failed: {e}")
-                        traceback.print_exc()
-                        update_task_status(task_id, "failed", 0, str(e), error=str(e))
-                
-                task_queue.task_done()
-                
-            except queue.Empty:
-                continue
+                    task = claim_task(self.worker_id)
+                    if task:
+                        # Tasks store only the file key; each host resolves it
+                        # against its own mount of the shared audio store
+                        self.process_task(task.id, os.path.join(self.app.config['UPLOAD_FOLDER'], task.filename))
+                if not task:
+                    time.sleep(POLL_INTERVAL)
             except Exception as e:
                 print(f"Worker error: {e}")
+                time.sleep(POLL_INTERVAL)
+
+    def check_lease(self):
+        if self.heartbeat and self.heartbeat.lost:
+            raise LeaseLost()
+
+    def process_task(self, task_id, audio_path):
+        # Must be called within an app context, after claim_task()
+        self.heartbeat = LeaseHeartbeat(self.app, task_id, self.worker_id)
+        self.heartbeat.start()
+        try:
+            # 1. Transcribe (claim_task already marked the task as processing)
+            update_task_status(task_id, "processing", 10, "Mentranskripsi audio...", worker_id=self.worker_id)
+            segments = transcribe_segments(audio_path)
+            self.check_lease()
+            
+            # 2. Diarize (label Q/A per speaker)
+            labeled = False
+            raw_transcript = " ".join(s['text'].strip() for s in segments)
+            if DIARIZATION_ENABLED:
+                update_task_status(task_id, "processing", 35, "Mengenali pembicara...", worker_id=self.worker_id)
+                try:
+                    raw_transcript = format_turns(diarize_segments(audio_path, segments))
+                    labeled = True
+                except Exception as e:
+                    print(f"Diarization failed, falling back to LLM labels: {e}")
+            
+            # 3. Format Dialogue (Chunked)
+            if labeled and SKIP_LLM_FORMAT:
+                formatted_content = raw_transcript
+            else:
+                update_task_status(task_id, "processing", 40, "Memformat dialog...", worker_id=self.worker_id)
+                formatted_content = format_dialogue_chunked(raw_transcript, task_id, labeled=labeled, worker_id=self.worker_id)
+            self.check_lease()
+            
+            # 4. Extract Metadata
+            update_task_status(task_id, "processing", 80, "Mengekstrak informasi...", worker_id=self.worker_id)
+            metadata = extract_metadata_from_transcript(formatted_content)
+            self.check_lease()
+            
+            # 5. Save to DB (Transcript)
+            task = TranscriptionTask.query.get(task_id)
+            if task:
+                new_transcript = Transcript(
+                    user_id=task.user_id,
+                    filename=os.path.basename(audio_path),
+                    participant_code=metadata.get('participant_code', '-'),
+                    participant_name=metadata.get('participant_name', '-'),
+                    participant_age=metadata.get('participant_age', '-'),
+                    participant_education=metadata.get('participant_education', '-'),
+                    content=formatted_content
+                )
+                db.session.add(new_transcript)
+                db.session.flush()
+                
+                # Update Task to Completed, only if we still hold the lease.
+                # Transcript insert and task update share one transaction.
+                completed = TranscriptionTask.query.filter_by(
+                    id=task_id, worker_id=self.worker_id, status='processing'
+                ).update({
+                    'status': 'completed',
+                    'progress': 100,
+                    'message': 'Selesai',
+                    'result_id': new_transcript.id,
+                    'lease_expires_at': None
+                }, synchronize_session=False)
+                if not completed:
+                    db.session.rollback()
+                    raise LeaseLost()
+                db.session.commit()
+                
+                # Clean up file
+                if os.path.exists(audio_path):
+                    os.remove(audio_path)
+            
+        except LeaseLost:
+            # Another worker reclaimed the task; leave it to them
+            db.session.rollback()
+            print(f"Abandoning task {task_id}: lease lost")
+        except Exception as e:
+            print(f"Task failed: {e}")
+            traceback.print_exc()
+            db.session.rollback()
+            update_task_status(task_id, "failed", 0, str(e), error=str(e), worker_id=self.worker_id)
+        finally:
+            self.heartbeat.stop()
+            self.heartbeat = None
+            print(f"Model memory: {json.dumps(get_model_stats())}")
 
 def start_worker(app):
-    worker = BackgroundWorker(app)
-    worker.start()
-    return worker
+    # Several threads share one copy of the models; with LLM_BATCH_SIZE > 1
+    # their dialogue chunks are decoded in the same batches
+    workers = []
+    for _ in range(WORKER_THREADS):
+        worker = BackgroundWorker(app)
+        worker.start()
+        workers.append(worker)
+    return workers
+
+def database_now():
+    # Lease deadlines are written and compared by workers on different hosts,
+    # so take "now" from the database's clock rather than each host's own.
+    # Returned as naive UTC like the other timestamps in the schema.
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        return db.session.execute(db.text("SELECT now() AT TIME ZONE 'UTC'")).scalar()
+    if dialect == 'sqlite':
+        value = db.session.execute(db.text("SELECT strftime('%Y-%m-%d %H:%M:%f', 'now')")).scalar()
+        return datetime.fromisoformat(value)
+    return datetime.utcnow()
+
+def lease_expired(now):
+    # Rows left in 'processing' by the old in-memory queue have no lease at
+    # all (upgrade_schema() adds the column as NULL); treat them as expired
+    return db.and_(
+        TranscriptionTask.status == 'processing',
+        db.or_(
+            TranscriptionTask.lease_expires_at.is_(None),
+            TranscriptionTask.lease_expires_at < now
+        )
+    )
+
+def claimable_filter(now):
+    return db.or_(
+        TranscriptionTask.status == 'queued',
+        db.and_(
+            lease_expired(now),
+            db.func.coalesce(TranscriptionTask.attempts, 0) < MAX_ATTEMPTS
+        )
+    )
+
+def claim_task(worker_id):
+    # Must be called within an app context.
+    # Compare-and-set on the row: the UPDATE only matches while the task is
+    # still claimable, so two workers racing for it cannot both win.
+    now = database_now()
+    
+    # Expired leases that already used up their attempts are given up on.
+    # Checked with a read first so an idle poll never takes the write lock.
+    exhausted = db.and_(
+        lease_expired(now),
+        db.func.coalesce(TranscriptionTask.attempts, 0) >= MAX_ATTEMPTS
+    )
+    if db.session.query(TranscriptionTask.id).filter(exhausted).first():
+        TranscriptionTask.query.filter(exhausted).update({
+            'status': 'failed',
+            'message': 'Gagal setelah beberapa percobaan',
+            'error': 'Worker lease expired too many times',
+            'lease_expires_at': None
+        }, synchronize_session=False)
+        db.session.commit()
+    
+    candidates = db.session.query(TranscriptionTask.id).filter(
+        claimable_filter(now)
+    ).order_by(TranscriptionTask.created_at).limit(5).all()
+    
+    for (task_id,) in candidates:
+        claimed = TranscriptionTask.query.filter(
+            TranscriptionTask.id == task_id,
+            claimable_filter(now)
+        ).update({
+            'status': 'processing',
+            'worker_id': worker_id,
+            'lease_expires_at': now + timedelta(seconds=LEASE_SECONDS),
+            'heartbeat_at': now,
+            'attempts': db.func.coalesce(TranscriptionTask.attempts, 0) + 1,
+            'progress': 0,
+            'message': 'Memulai proses...'
+        }, synchronize_session=False)
+        db.session.commit()
+        if claimed:
+            return TranscriptionTask.query.get(task_id)
+    
+    return None
+
+def renew_lease(task_id, worker_id):
+    # Must be called within an app context. Returns False if the lease was lost.
+    now = database_now()
+    renewed = TranscriptionTask.query.filter_by(
+        id=task_id, worker_id=worker_id, status='processing'
+    ).update({
+        'lease_expires_at': now + timedelta(seconds=LEASE_SECONDS),
+        'heartbeat_at': now
+    }, synchronize_session=False)
+    db.session.commit()
+    return bool(renewed)
+
+def load_whisper():
+    # Use 'medium' model as requested
+    if os.path.exists(WHISPER_MODEL_PATH):
+        return WhisperModel(WHISPER_MODEL_PATH, device="cpu", compute_type="int8")
+    # Fallback or auto-download if setup_models.py wasn't run
+    return WhisperModel("medium", device="cpu", compute_type="int8")
+
+def load_llm(n_ctx=4096):
+    if not os.path.exists(LLM_MODEL_PATH):
+        print("LLM Model not found locally.")
+        return None
+    # use_mmap maps the GGUF read-only, so processes on the same host share
+    # the weights through the page cache; use_mlock would pin a private copy
+    return Llama(
+        model_path=LLM_MODEL_PATH,
+        n_ctx=n_ctx,
+        n_threads=4,
+        use_mmap=True,
+        use_mlock=False
+    )
+
+def close_llm(llm):
+    if hasattr(llm, 'close'):
+        llm.close()
+
+def load_batched_llm():
+    # The Llama only provides weights and tokenizer; the batch context
+    # allocates its own KV cache, so keep the Llama's own context tiny
+    llm = load_llm(n_ctx=256)
+    if llm is None:
+        return None
+    return BatchedLLM(llm, n_seq=LLM_BATCH_SIZE, seq_ctx=LLM_BATCH_SEQ_CTX, n_threads=4)
+
+def close_batched_llm(engine):
+    engine.close()
+    close_llm(engine.llm)
 
 def load_models():
-    global whisper_model, llm_model
+    # Registers the models; each is loaded the first time it is used
+    whisper_size = path_size(WHISPER_MODEL_PATH) if os.path.exists(WHISPER_MODEL_PATH) else 1600 * MB
+    model_manager.register('whisper', load_whisper, whisper_size)
     
-    if whisper_model is None:
-        print("Loading Whisper model...")
-        # Use 'medium' model as requested
-        model_path = "models/whisper-medium" 
-        if os.path.exists(model_path):
-             whisper_model = WhisperModel(model_path, device="cpu", compute_type="int8")
-        else:
-             # Fallback or auto-download if setup_models.py wasn't run
-             whisper_model = WhisperModel("medium", device="cpu", compute_type="int8")
-            
-    if llm_model is None:
-        print("Loading LLM model...")
-        model_path = f"models/{MODEL_FILENAME}"
-        if os.path.exists(model_path):
-            llm_model = Llama(
-                model_path=model_path,
-                n_ctx=4096,
-                n_threads=4
-            )
-        else:
-            print("LLM Model not found locally.")
+    llm_size = path_size(LLM_MODEL_PATH) if os.path.exists(LLM_MODEL_PATH) else 0
+    if LLM_BATCH_SIZE > 1:
+        kv_bytes = LLM_BATCH_SIZE * LLM_BATCH_SEQ_CTX * LLM_KV_BYTES_PER_TOKEN
+        model_manager.register(
+            'llm', load_batched_llm, llm_size + kv_bytes,
+            unloader=close_batched_llm, mapped_path=LLM_MODEL_PATH
+        )
+    else:
+        model_manager.register(
+            'llm', load_llm, llm_size + LLM_CONTEXT_MB * MB,
+            unloader=close_llm, mapped_path=LLM_MODEL_PATH
+        )
+
+def get_model_stats():
+    return model_manager.stats()
 
 def add_task(audio_path, user_id):
     task_id = str(uuid.uuid4())
@@ -136,33 +374,38 @@ def add_task(audio_path, user_id):
         filename=os.path.basename(audio_path),
         status='queued',
         progress=0,
-        message='Menunggu antrian...'
+        message='Menunggu antrian...',
+        attempts=0
     )
     db.session.add(new_task)
     db.session.commit()
     
-    # Add to memory queue for worker
-    task_queue.put({
-        'id': task_id,
-        'audio_path': audio_path,
-        'user_id': user_id
-    })
-    
+    # Any worker polling the table will pick it up
     return task_id
 
-def update_task_status(task_id, status, progress, message, error=None):
-    # This function must be called within an app context
+def update_task_status(task_id, status, progress, message, error=None, worker_id=None):
+    # This function must be called within an app context.
+    # When worker_id is given, only the worker holding the lease may update,
+    # and only while the task is still processing: a worker whose lease
+    # expired must not resurrect a task another worker has completed.
+    # A single UPDATE keeps the write transaction (and SQLite lock) short.
+    # Returns False if the write failed (e.g. "database is locked").
+    values = {'status': status, 'progress': progress, 'message': message}
+    if error:
+        values['error'] = error
     try:
-        task = TranscriptionTask.query.get(task_id)
-        if task:
-            task.status = status
-            task.progress = progress
-            task.message = message
-            if error:
-                task.error = error
-            db.session.commit()
+        query = TranscriptionTask.query.filter_by(id=task_id)
+        if worker_id is not None:
+            query = query.filter_by(worker_id=worker_id, status='processing')
+        query.update(values, synchronize_session=False)
+        db.session.commit()
+        return True
     except Exception as e:
+        db.session.rollback()
         print(f"Failed to update task status: {e}")
+        return False
+
+STATUS_PREVIEW_CHARS = 300
 
 def get_task_status(task_id):
     task = TranscriptionTask.query.get(task_id)
@@ -175,7 +418,8 @@ def get_task_status(task_id):
         if transcript:
             result_data = {
                 "transcript_id": transcript.id,
-                "content": transcript.content,
+                # Polls only need a preview; the download routes return the full text
+                "preview": transcript.preview(STATUS_PREVIEW_CHARS),
                 "metadata": {
                     "participant_code": transcript.participant_code,
                     "participant_name": transcript.participant_name,
@@ -193,32 +437,93 @@ def get_task_status(task_id):
         'result': result_data
     }
 
-def transcribe_audio(audio_path):
-    segments, info = whisper_model.transcribe(audio_path, beam_size=5)
-    
-    full_text = ""
-    for segment in segments:
-        full_text += segment.text + " "
+def transcribe_segments(audio_path):
+    with model_manager.use('whisper') as whisper_model:
+        segments, info = whisper_model.transcribe(audio_path, beam_size=5)
         
-    return full_text.strip()
+        # Segments are generated lazily, so consume them while the model is pinned
+        return [
+            {'start': segment.start, 'end': segment.end, 'text': segment.text}
+            for segment in segments
+        ]
+
+def split_turn(turn, chunk_size):
+    # Split one over-long turn at sentence (or else word) boundaries,
+    # repeating its speaker label on every piece
+    match = re.match(r'([QA]): ', turn)
+    label = match.group(0) if match else ""
+    body = turn[len(label):]
+    limit = chunk_size - len(label)
+    
+    words = []
+    for sentence in re.split(r'(?<=[.!?])\s+', body):
+        if len(sentence) <= limit:
+            words.append(sentence)
+            continue
+        for word in sentence.split():
+            # A single "word" longer than the limit is cut as a last resort
+            words.extend(word[i:i+limit] for i in range(0, len(word), limit))
+    
+    pieces = []
+    current = ""
+    for word in words:
+        if current and len(current) + len(word) + 1 > limit:
+            pieces.append(current)
+            current = ""
+        current = f"{current} {word}" if current else word
+    if current:
+        pieces.append(current)
+    return [label + piece for piece in pieces]
+
+def chunk_turns(text, chunk_size):
+    # Keep speaker turns whole where possible so labels never straddle a
+    # chunk boundary; turns longer than a chunk are split with their label
+    chunks = []
+    current = ""
+    for turn in text.split("\n\n"):
+        pieces = split_turn(turn, chunk_size) if len(turn) > chunk_size else [turn]
+        for piece in pieces:
+            if current and len(current) + len(piece) + 2 > chunk_size:
+                chunks.append(current)
+                current = ""
+            current = f"{current}\n\n{piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
 
-def format_dialogue_chunked(text, task_id):
-    if not llm_model:
-        return text
+def format_dialogue_chunked(text, task_id, labeled=False, worker_id=None):
+    with model_manager.use('llm') as llm_model:
+        if not llm_model:
+            return text
         
-    # Simple chunking logic
-    chunk_size = 2000
-    chunks = [text[i:i+chunk_size] for i in range(0, len(text), chunk_size)]
+        chunk_size = 2000
+        if labeled:
+            chunks = chunk_turns(text, chunk_size)
+        else:
+            # Simple chunking logic
+            chunks = [text[i:i+chunk_size] for i in range(0, len(text), chunk_size)]
     
-    formatted_chunks = []
-    total_chunks = len(chunks)
+        formatted_chunks = []
+        total_chunks = len(chunks)
     
-    for i, chunk in enumerate(chunks):
-        # Update progress based on chunk processing
-        progress = 40 + int((i / total_chunks) * 40) # 40% to 80%
-        update_task_status(task_id, "processing", progress, f"Memformat bagian {i+1}/{total_chunks}...")
+        requests = []
+        for chunk in chunks:
+            if labeled:
+                prompt = f"""
+        Rapikan tanda baca dialog wawancara berikut.
+        Jangan mengubah label "Q:" dan "A:" maupun urutan giliran bicara.
         
-        prompt = f"""
+        Teks:
+        {chunk}
+        
+        Dialog:
+        """
+                # Output is the same turns re-punctuated, so budget by input size
+                with llm_lock(llm_model):
+                    n_tokens = len(llm_model.tokenize(chunk.encode('utf-8')))
+                max_tokens = min(1024, int(n_tokens * 1.2) + 32)
+            else:
+                prompt = f"""
         Ubah teks berikut menjadi format dialog wawancara yang rapi.
         Tandai pembicara dengan "Q:" (Pewawancara) dan "A:" (Partisipan) jika bisa dideteksi.
         Jika tidak, rapikan saja tanda bacanya.
@@ -228,22 +533,44 @@ def format_dialogue_chunked(text, task_id):
         
         Dialog:
         """
+                max_tokens = 1024
+            requests.append((prompt, max_tokens))
         
-        output = llm_model(
-            prompt, 
-            max_tokens=1024, 
-            stop=["Teks:", "Dialog:"], 
-            echo=False
-        )
-        formatted_chunks.append(output['choices'][0]['text'].strip())
+        # Batched mode: submit every chunk up front so they decode together
+        # (alongside chunks of other tasks running in this process)
+        batched = isinstance(llm_model, BatchedLLM)
+        if batched:
+            futures = [
+                llm_model.submit(prompt, max_tokens=max_tokens, stop=["Teks:", "Dialog:"])
+                for prompt, max_tokens in requests
+            ]
         
-    return "\n\n".join(formatted_chunks)
+        for i, (prompt, max_tokens) in enumerate(requests):
+            # Update progress based on chunk processing
+            progress = 40 + int((i / total_chunks) * 40) # 40% to 80%
+            update_task_status(task_id, "processing", progress, f"Memformat bagian {i+1}/{total_chunks}...", worker_id=worker_id)
+            
+            if batched:
+                # Waiting on futures in chunk order keeps the dialogue in order
+                output = futures[i].result()
+            else:
+                with llm_lock(llm_model):
+                    output = llm_model(
+                        prompt, 
+                        max_tokens=max_tokens, 
+                        stop=["Teks:", "Dialog:"], 
+                        echo=False
+                    )
+            formatted_chunks.append(output['choices'][0]['text'].strip())
+        
+        return "\n\n".join(formatted_chunks)
 
 def extract_metadata_from_transcript(text):
-    if not llm_model:
-        return {}
+    with model_manager.use('llm') as llm_model:
+        if not llm_model:
+            return {}
         
-    prompt = f"""
+        prompt = f"""
     Analisis transkrip berikut dan ekstrak informasi:
     1. Kode Partisipan (contoh: P1, P2)
     2. Nama Partisipan
@@ -264,24 +591,25 @@ def extract_metadata_from_transcript(text):
     {text[:4000]}
     """
     
-    try:
-        output = llm_model(
-            prompt,
-            max_tokens=200,
-            stop=["Transkrip:"],
-            echo=False
-        )
-        json_str = output['choices'][0]['text'].strip()
-        # Clean up JSON string if needed
-        if "```json" in json_str:
-            json_str = json_str.split("```json")[1].split("```")[0]
-        elif "{" not in json_str:
-             # Fallback if LLM doesn't output JSON
-             return {}
+        try:
+            with llm_lock(llm_model):
+                output = llm_model(
+                    prompt,
+                    max_tokens=200,
+                    stop=["Transkrip:"],
+                    echo=False
+                )
+            json_str = output['choices'][0]['text'].strip()
+            # Clean up JSON string if needed
+            if "```json" in json_str:
+                json_str = json_str.split("```json")[1].split("```")[0]
+            elif "{" not in json_str:
+                 # Fallback if LLM doesn't output JSON
+                 return {}
              
-        return json.loads(json_str)
-    except:
-        return {}
+            return json.loads(json_str)
+        except:
+            return {}
 
 def generate_docx(transcript):
     doc = Document()
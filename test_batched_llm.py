@@ -0,0 +1,204 @@
+import os
+import sys
+import types
+import ctypes
+import importlib.util
+
+# Tests for BatchedLLM's scheduler against a fake llama_cpp / Llama, so they
+# run without model weights or the native library.
+#
+# The fake model makes every sequence count up from the first token of its
+# prompt (its "identity"): <10><11><12>... and emit end-of-generation after
+# `eog_after` tokens, so each result shows which request it came from and
+# how long it ran.
+#
+# Usage: python test_batched_llm.py  (or collect with pytest)
+
+VOCAB = 64
+EOG = 1
+
+class FakeBatch:
+    def __init__(self, n_tokens, embd, n_seq_max):
+        self.token = [0] * n_tokens
+        self.pos = [0] * n_tokens
+        self.n_seq_id = [0] * n_tokens
+        self.seq_id = [[0] for _ in range(n_tokens)]
+        self.logits = [0] * n_tokens
+        self.n_tokens = 0
+
+class FakeBackend:
+    def __init__(self, eog_after):
+        self.eog_after = eog_after
+        self.identity = {}   # seq slot -> first prompt token
+        self.generated = {}  # seq slot -> tokens produced so far
+        self.logits = {}
+        self.slots_used = set()
+        self.removed = []
+
+    def module(self):
+        fake = types.ModuleType('llama_cpp')
+        fake.llama_context_default_params = lambda: types.SimpleNamespace()
+        fake.llama_new_context_with_model = lambda model, params: object()
+        fake.llama_batch_init = FakeBatch
+        fake.llama_batch_free = lambda batch: None
+        fake.llama_free = lambda ctx: None
+        fake.llama_decode = self.decode
+        fake.llama_get_logits_ith = lambda ctx, i: ctypes.cast(self.logits[i], ctypes.POINTER(ctypes.c_float))
+        fake.llama_kv_cache_seq_rm = self.seq_rm
+        fake.llama_token_is_eog = lambda model, token: token == EOG
+        return fake
+
+    def decode(self, ctx, batch):
+        self.logits = {}
+        for i in range(batch.n_tokens):
+            slot = batch.seq_id[i][0]
+            self.slots_used.add(slot)
+            if batch.pos[i] == 0:
+                self.identity[slot] = batch.token[i]
+                self.generated[slot] = 0
+            if not batch.logits[i]:
+                continue
+            eog_after = self.eog_after(self.identity[slot])
+            next_token = EOG if self.generated[slot] >= eog_after else self.identity[slot] + self.generated[slot]
+            self.generated[slot] += 1
+            logits = (ctypes.c_float * VOCAB)(*([-1e9] * VOCAB))
+            logits[next_token] = 0.0
+            self.logits[i] = logits
+        return 0
+
+    def seq_rm(self, ctx, slot, p0, p1):
+        self.removed.append(slot)
+        return True
+
+class FakeLlama:
+    model = object()
+
+    def n_vocab(self):
+        return VOCAB
+
+    def tokenize(self, text, add_bos=True, special=False):
+        # "7 filler filler" -> [7, 2, 2]
+        words = text.decode('utf-8').split()
+        return [int(words[0])] + [2] * (len(words) - 1)
+
+    def detokenize(self, tokens):
+        return f"<{tokens[0]}>".encode('utf-8')
+
+    def token_eos(self):
+        return EOG
+
+def load_batched_llm(backend):
+    # Import batched_llm against the fake without touching a real llama_cpp
+    real = sys.modules.get('llama_cpp')
+    sys.modules['llama_cpp'] = backend.module()
+    try:
+        spec = importlib.util.spec_from_file_location(
+            'batched_llm_under_test', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'batched_llm.py')
+        )
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    finally:
+        if real is not None:
+            sys.modules['llama_cpp'] = real
+        else:
+            del sys.modules['llama_cpp']
+    return module.BatchedLLM
+
+def make_engine(eog_after, n_seq):
+    backend = FakeBackend(eog_after)
+    BatchedLLM = load_batched_llm(backend)
+    return BatchedLLM(FakeLlama(), n_seq=n_seq, seq_ctx=64, seed=0), backend
+
+def counting(identity, n):
+    return "".join(f"<{identity + k}>" for k in range(n))
+
+def text_of(future):
+    return future.result(timeout=10)['choices'][0]['text']
+
+def test_results_follow_submit_order():
+    # Equal-length requests finish in the order they were submitted, and
+    # every future gets the output of its own prompt
+    engine, backend = make_engine(lambda identity: 3, n_seq=3)
+    try:
+        done = []
+        futures = []
+        for identity in range(10, 17):
+            future = engine.submit(f"{identity} filler filler", max_tokens=20)
+            future.add_done_callback(lambda f, identity=identity: done.append(identity))
+            futures.append(future)
+        texts = [text_of(f) for f in futures]
+    finally:
+        engine.close()
+
+    assert texts == [counting(identity, 3) for identity in range(10, 17)]
+    assert done == list(range(10, 17))
+
+def test_mixed_lengths_keep_results_with_their_request():
+    # Short requests finish before long ones, but results never get mixed up
+    engine, backend = make_engine(lambda identity: identity - 8, n_seq=2)
+    try:
+        futures = [engine.submit(f"{identity} filler", max_tokens=20) for identity in (18, 10, 15, 11)]
+        texts = [text_of(f) for f in futures]
+    finally:
+        engine.close()
+
+    assert texts == [counting(identity, identity - 8) for identity in (18, 10, 15, 11)]
+
+def test_slots_are_freed_and_reused():
+    engine, backend = make_engine(lambda identity: 2, n_seq=2)
+    try:
+        futures = [engine.submit(f"{identity} filler", max_tokens=20) for identity in range(10, 15)]
+        for f in futures:
+            text_of(f)
+    finally:
+        engine.close()
+
+    # Five requests ran through only two KV-cache slots, each freed on finish
+    assert backend.slots_used == {0, 1}
+    assert set(backend.removed) == {0, 1}
+    assert len(backend.removed) == 5
+    assert not engine.running_seqs
+
+def test_max_tokens_truncates():
+    engine, backend = make_engine(lambda identity: 50, n_seq=2)
+    try:
+        future = engine.submit("12 filler", max_tokens=4)
+        result = future.result(timeout=10)
+    finally:
+        engine.close()
+
+    assert result['choices'][0]['text'] == counting(12, 4)
+    assert result['usage']['completion_tokens'] == 4
+
+def test_stop_string_truncates():
+    engine, backend = make_engine(lambda identity: 50, n_seq=2)
+    try:
+        future = engine.submit("13 filler", max_tokens=20, stop=["Z", "<15>"])
+        text = text_of(future)
+    finally:
+        engine.close()
+
+    # Output is cut right before the stop string
+    assert text == "<13><14>"
+
+def test_prompt_too_long_is_rejected():
+    engine, backend = make_engine(lambda identity: 2, n_seq=1)
+    try:
+        future = engine.submit("10 " + "filler " * 80, max_tokens=8)
+        error = future.exception(timeout=10)
+    finally:
+        engine.close()
+
+    assert isinstance(error, ValueError)
+
+if __name__ == '__main__':
+    tests = [(name, fn) for name, fn in list(globals().items()) if name.startswith('test_')]
+    failed = 0
+    for name, fn in tests:
+        try:
+            fn()
+            print(f"PASSED {name}")
+        except Exception as e:
+            failed += 1
+            print(f"FAILED {name}: {e!r}")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,171 @@
+import os
+import sys
+import random
+import tempfile
+
+import compression
+from compression import compress_text, decompress_text, decompress_preview, train_dictionary
+
+# Round-trip tests for the compressed transcript format (compression.py)
+# and Transcript.content, including rows written before compression.
+#
+# Usage: python test_compression.py  (or collect with pytest)
+
+WORDS = ["pasien", "batuk", "obat", "puskesmas", "minggu", "dahak", "keluarga", "mual", "pusing", "rumah"]
+
+def sample_transcript(rng, turns=20):
+    lines = []
+    for i in range(turns):
+        speaker = "Q" if i % 2 == 0 else "A"
+        lines.append(f"{speaker}: " + " ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 30))) + ".")
+    return "\n\n".join(lines)
+
+TEXT = "Q: Sejak kapan ibu batuk?\n\nA: Sudah tiga minggu — kadang sampai sesak. 咳嗽 🙂\n\n" * 40
+
+def make_app():
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'compression.db')}"
+    from worker import create_worker_app
+    from extensions import db
+    from models import User
+
+    app = create_worker_app()
+    with app.app_context():
+        user = User(username='compression')
+        user.set_password('compression')
+        db.session.add(user)
+        db.session.commit()
+        app.config['TEST_USER_ID'] = user.id
+    return app
+
+def save_transcript(app, content):
+    from extensions import db
+    from models import Transcript
+    transcript = Transcript(user_id=app.config['TEST_USER_ID'], filename='a.wav', content=content)
+    db.session.add(transcript)
+    db.session.commit()
+    return transcript.id
+
+def load_transcript(transcript_id):
+    from extensions import db
+    from models import Transcript
+    db.session.expire_all()
+    return Transcript.query.get(transcript_id)
+
+def test_zlib_round_trip():
+    saved = compression.zstandard
+    compression.zstandard = None
+    try:
+        blob = compress_text(TEXT)
+    finally:
+        compression.zstandard = saved
+    assert blob[:1] == compression.CODEC_ZLIB
+    assert decompress_text(blob) == TEXT
+    assert decompress_preview(blob, 100) == TEXT[:100]
+
+def test_zstd_round_trip_without_dictionary():
+    blob = compress_text(TEXT)
+    assert blob[:1] == compression.CODEC_ZSTD
+    assert blob[1:5] == b'\0\0\0\0'
+    assert len(blob) < len(TEXT.encode('utf-8'))
+    assert decompress_text(blob) == TEXT
+    # Multi-byte characters near the cut must not be mangled
+    for n in (1, 50, 63, 64, 65, 300, len(TEXT) + 10):
+        assert decompress_preview(blob, n) == TEXT[:n]
+
+def test_unknown_codec_is_rejected():
+    for decompress in (decompress_text, lambda blob: decompress_preview(blob, 10)):
+        try:
+            decompress(b'x' + b'data')
+            assert False, "expected ValueError"
+        except ValueError:
+            pass
+
+def test_none_round_trip():
+    assert compress_text(None) is None
+    assert decompress_text(None) is None
+    assert decompress_preview(None, 10) is None
+
+def test_dictionary_rows_stay_readable_after_retraining():
+    from extensions import db
+    from models import CompressionDictionary
+
+    rng = random.Random(0)
+    app = make_app()
+    with app.app_context():
+        first = train_dictionary([sample_transcript(rng) for _ in range(200)], size=4096)
+        assert first
+        db.session.add(CompressionDictionary(data=first))
+        db.session.commit()
+        old_text = sample_transcript(rng)
+        old_id = save_transcript(app, old_text)
+
+        # A newer dictionary becomes active for new rows only
+        second = train_dictionary([sample_transcript(rng) for _ in range(200)], size=4096)
+        db.session.add(CompressionDictionary(data=second))
+        db.session.commit()
+        new_text = sample_transcript(rng)
+        new_id = save_transcript(app, new_text)
+
+        # Start from a cold cache, as a fresh process would
+        compression.dictionary_cache.clear()
+        old_row, new_row = load_transcript(old_id), load_transcript(new_id)
+        dict_ids = {CompressionDictionary.query.filter_by(data=d).first().id for d in (first, second)}
+        assert {int.from_bytes(row.content_blob[1:5], 'big') for row in (old_row, new_row)} == dict_ids
+        assert old_row.content == old_text
+        assert new_row.content == new_text
+        assert old_row.preview(40) == old_text[:40]
+
+def test_legacy_uncompressed_rows():
+    from extensions import db
+    from models import Transcript
+
+    app = make_app()
+    with app.app_context():
+        transcript_id = save_transcript(app, "placeholder")
+        # As written before compression existed
+        Transcript.query.filter_by(id=transcript_id).update(
+            {'content_text': TEXT, 'content_blob': None}, synchronize_session=False
+        )
+        db.session.commit()
+
+        row = load_transcript(transcript_id)
+        assert row.content == TEXT
+        assert row.preview(300) == TEXT[:300]
+
+        # Writing through the property moves the row to the compressed column
+        row.content = row.content
+        db.session.commit()
+        row = load_transcript(transcript_id)
+        assert row.content_text is None
+        assert row.content_blob is not None
+        assert row.content == TEXT
+
+def test_status_returns_preview_only():
+    import services
+    from extensions import db
+    from models import TranscriptionTask
+
+    app = make_app()
+    with app.app_context():
+        transcript_id = save_transcript(app, TEXT)
+        task_id = services.add_task("a.wav", app.config['TEST_USER_ID'])
+        TranscriptionTask.query.filter_by(id=task_id).update(
+            {'status': 'completed', 'result_id': transcript_id}, synchronize_session=False
+        )
+        db.session.commit()
+
+        result = services.get_task_status(task_id)['result']
+        assert 'content' not in result
+        assert result['preview'] == TEXT[:services.STATUS_PREVIEW_CHARS]
+
+if __name__ == '__main__':
+    tests = [(name, fn) for name, fn in list(globals().items()) if name.startswith('test_')]
+    failed = 0
+    for name, fn in tests:
+        try:
+            fn()
+            print(f"PASSED {name}")
+        except Exception as e:
+            failed += 1
+            print(f"FAILED {name}: {e!r}")
+    sys.exit(1 if failed else 0)
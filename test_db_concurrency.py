@@ -0,0 +1,127 @@
+import os
+import sys
+import time
+import random
+import tempfile
+import threading
+import traceback
+
+# Stress test for the database layer: several worker threads claim and
+# update tasks while many "status poll" threads read at the same time,
+# the same pattern as BackgroundWorker + /api/status under load.
+#
+# Usage: python test_db_concurrency.py [DATABASE_URL]  (or collect with pytest)
+# Defaults to a fresh SQLite file in a temp directory.
+
+NUM_TASKS = 200
+NUM_WORKERS = 4
+NUM_READERS = 8
+UPDATES_PER_TASK = 5
+
+def main(database_url=None):
+    tmp_dir = tempfile.mkdtemp()
+    os.environ['DATABASE_URL'] = database_url or f"sqlite:///{os.path.join(tmp_dir, 'stress.db')}"
+    print("Database:", os.environ['DATABASE_URL'])
+
+    from worker import create_worker_app
+    from extensions import db
+    from models import User, TranscriptionTask
+    import services
+
+    app = create_worker_app()
+    with app.app_context():
+        user = User(username=f"stress_{random.randint(0, 10**6)}")
+        user.set_password('stress')
+        db.session.add(user)
+        db.session.commit()
+        task_ids = [services.add_task(os.path.join(tmp_dir, f"audio_{i}.wav"), user.id) for i in range(NUM_TASKS)]
+
+    errors = []
+    claimed = []
+    read_latencies = []
+    lock = threading.Lock()
+    writers_done = threading.Event()
+
+    def worker_loop(n):
+        worker_id = f"stress-worker-{n}"
+        with app.app_context():
+            while True:
+                try:
+                    task = services.claim_task(worker_id)
+                    if not task:
+                        return
+                    with lock:
+                        claimed.append(task.id)
+                    # update_task_status swallows "database is locked" and
+                    # only reports it through its return value
+                    for step in range(UPDATES_PER_TASK):
+                        if not services.update_task_status(task.id, "processing", step * 10, f"Langkah {step}", worker_id=worker_id):
+                            with lock:
+                                errors.append(f"writer: status update failed for {task.id}")
+                        if not services.renew_lease(task.id, worker_id):
+                            with lock:
+                                errors.append(f"writer: lease lost for {task.id}")
+                    if not services.update_task_status(task.id, "completed", 100, "Selesai", worker_id=worker_id):
+                        with lock:
+                            errors.append(f"writer: completion failed for {task.id}")
+                except Exception as e:
+                    with lock:
+                        errors.append(f"writer: {e}")
+                    traceback.print_exc()
+
+    def reader_loop():
+        with app.app_context():
+            while not writers_done.is_set():
+                try:
+                    start = time.perf_counter()
+                    services.get_task_status(random.choice(task_ids))
+                    TranscriptionTask.query.filter(
+                        TranscriptionTask.status.in_(['queued', 'processing'])
+                    ).count()
+                    with lock:
+                        read_latencies.append(time.perf_counter() - start)
+                except Exception as e:
+                    with lock:
+                        errors.append(f"reader: {e}")
+                # Release the connection between polls like a real request would
+                db.session.remove()
+
+    start = time.perf_counter()
+    writers = [threading.Thread(target=worker_loop, args=(i,)) for i in range(NUM_WORKERS)]
+    readers = [threading.Thread(target=reader_loop) for _ in range(NUM_READERS)]
+    for t in writers + readers:
+        t.start()
+    for t in writers:
+        t.join()
+    writers_done.set()
+    for t in readers:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    with app.app_context():
+        completed = TranscriptionTask.query.filter(
+            TranscriptionTask.id.in_(task_ids),
+            TranscriptionTask.status == 'completed'
+        ).count()
+
+    read_latencies.sort()
+    p50 = read_latencies[len(read_latencies) // 2] * 1000 if read_latencies else 0
+    p99 = read_latencies[int(len(read_latencies) * 0.99)] * 1000 if read_latencies else 0
+
+    print(f"Elapsed: {elapsed:.2f}s")
+    print(f"Tasks completed: {completed}/{NUM_TASKS}")
+    print(f"Claims: {len(claimed)} ({len(set(claimed))} unique)")
+    print(f"Reads: {len(read_latencies)} (p50 {p50:.1f} ms, p99 {p99:.1f} ms)")
+    print(f"Errors: {len(errors)}")
+    for error in errors[:10]:
+        print("  ", error)
+
+    ok = not errors and completed == NUM_TASKS and len(claimed) == len(set(claimed)) == NUM_TASKS
+    print("PASSED" if ok else "FAILED")
+    return ok
+
+def test_db_concurrency():
+    assert main()
+
+if __name__ == '__main__':
+    sys.exit(0 if main(sys.argv[1] if len(sys.argv) > 1 else None) else 1)
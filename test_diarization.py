@@ -0,0 +1,120 @@
+import re
+import sys
+import warnings
+import numpy as np
+
+import diarization
+from diarization import cluster_embeddings, assign_roles, fill_short_labels, diarize_segments, SAMPLE_RATE
+
+# Tests for speaker labeling (diarization.py) and for splitting labeled
+# turns into LLM chunks (services.chunk_turns), on synthetic data.
+#
+# Usage: python test_diarization.py  (or collect with pytest)
+
+def segment(text, start=0.0, end=1.0):
+    return {'start': start, 'end': end, 'text': text}
+
+def test_cluster_embeddings_separates_two_sources():
+    rng = np.random.default_rng(0)
+    centers = np.eye(2, 16, dtype=np.float32)
+    source = np.array([0, 1, 1, 0, 1, 0, 0, 1, 0, 1, 1, 0])
+    embeddings = centers[source] + rng.normal(0, 0.1, (len(source), 16)).astype(np.float32)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+    labels = cluster_embeddings(embeddings, num_speakers=2)
+    # Cluster ids are arbitrary; the grouping must match the sources
+    assert np.array_equal(labels == labels[0], source == source[0])
+    assert len(set(labels)) == 2
+
+def test_assign_roles_most_questions_is_interviewer():
+    segments = [segment("Saya petani."), segment("Berapa usia Anda?"), segment("Tinggal di mana?"), segment("Di desa.")]
+    assert assign_roles(segments, [0, 1, 1, 0]) == ['A', 'Q', 'Q', 'A']
+
+def test_assign_roles_tie_goes_to_first_speaker():
+    segments = [segment("Selamat pagi."), segment("Pagi."), segment("Apa kabar?"), segment("Baik, Anda?")]
+    assert assign_roles(segments, [1, 0, 1, 0]) == ['Q', 'A', 'Q', 'A']
+    assert assign_roles(segments, [0, 1, 0, 1]) == ['Q', 'A', 'Q', 'A']
+
+def test_fill_short_labels():
+    assert fill_short_labels(np.array([-1, -1, 1, -1, 0, -1])).tolist() == [1, 1, 1, 1, 0, 0]
+    assert fill_short_labels(np.array([-1, -1])).tolist() == [0, 0]
+
+def test_diarize_segments_labels_synthetic_speakers():
+    # Two "voices" (a low and a high tone), alternating one second each,
+    # with a short back-channel segment the embedding step cannot use
+    rng = np.random.default_rng(0)
+    t = np.arange(SAMPLE_RATE) / SAMPLE_RATE
+    voices = [np.sin(2 * np.pi * 220 * t), np.sin(2 * np.pi * 3000 * t)]
+    order = [0, 1, 0, 1]
+    audio = np.concatenate([voices[v] for v in order]).astype(np.float32)
+    audio += rng.normal(0, 0.01, len(audio)).astype(np.float32)
+
+    segments = [
+        segment("Boleh saya tanya?", 0.0, 1.0),
+        segment("Boleh.", 1.0, 1.9),
+        segment("Ya.", 1.9, 2.0),
+        segment("Sejak kapan sakit?", 2.0, 3.0),
+        segment("Tiga minggu.", 3.0, 4.0),
+    ]
+    original = diarization.decode_audio
+    diarization.decode_audio = lambda path, sampling_rate: audio
+    try:
+        turns = diarize_segments("synthetic.wav", segments)
+    finally:
+        diarization.decode_audio = original
+
+    # The short "Ya." joins the answer before it
+    assert [(turn['speaker'], turn['text']) for turn in turns] == [
+        ('Q', "Boleh saya tanya?"),
+        ('A', "Boleh. Ya."),
+        ('Q', "Sejak kapan sakit?"),
+        ('A', "Tiga minggu."),
+    ]
+
+def test_short_segment_only_has_no_warnings():
+    original = diarization.decode_audio
+    diarization.decode_audio = lambda path, sampling_rate: np.zeros(SAMPLE_RATE // 10, dtype=np.float32)
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            turns = diarize_segments("short.wav", [segment("Halo?", 0.0, 0.1)])
+    finally:
+        diarization.decode_audio = original
+    assert [turn['speaker'] for turn in turns] == ['Q']
+
+def test_chunk_turns_respects_chunk_size():
+    from services import chunk_turns
+
+    chunk_size = 200
+    long_answer = " ".join(f"Kalimat nomor {i} dari jawaban panjang." for i in range(40))
+    no_punctuation = " ".join(["kata"] * 120)
+    one_word = "x" * 500
+    turns = [
+        "Q: Bisa ceritakan pengalaman Anda?",
+        f"A: {long_answer}",
+        f"Q: {no_punctuation}",
+        f"A: {one_word}",
+        "Q: Terima kasih.",
+    ]
+    chunks = chunk_turns("\n\n".join(turns), chunk_size)
+
+    assert all(len(chunk) <= chunk_size for chunk in chunks)
+    pieces = [piece for chunk in chunks for piece in chunk.split("\n\n")]
+    assert all(re.match(r'[QA]: ', piece) for piece in pieces)
+    # Splitting loses no text and keeps each piece under its turn's label
+    for label, body in (("A: ", long_answer), ("Q: ", no_punctuation)):
+        rebuilt = " ".join(p[len(label):] for p in pieces if p.startswith(label) and p[len(label):] in body)
+        assert rebuilt == body
+    assert "".join(p[3:] for p in pieces if set(p[3:]) == {"x"}) == one_word
+
+if __name__ == '__main__':
+    tests = [(name, fn) for name, fn in list(globals().items()) if name.startswith('test_')]
+    failed = 0
+    for name, fn in tests:
+        try:
+            fn()
+            print(f"PASSED {name}")
+        except Exception as e:
+            failed += 1
+            print(f"FAILED {name}: {e!r}")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,110 @@
+import sys
+import threading
+
+from model_manager import ModelManager
+
+# Tests for ModelManager's locking: a slow load must only hold up callers of
+# the model being loaded.
+#
+# Usage: python test_model_manager.py  (or collect with pytest)
+
+class SlowLoader:
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self):
+        self.calls += 1
+        self.started.set()
+        assert self.release.wait(timeout=10)
+        return self.name
+
+def use_in_thread(manager, name, results):
+    def run():
+        with manager.use(name) as instance:
+            results.append(instance)
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+def test_slow_load_does_not_block_other_models():
+    manager = ModelManager()
+    whisper = SlowLoader('whisper')
+    manager.register('whisper', whisper, 0)
+    manager.register('llm', lambda: 'llm', 0)
+
+    # Load llm first so it is already resident
+    with manager.use('llm') as instance:
+        assert instance == 'llm'
+
+    results = []
+    loading = use_in_thread(manager, 'whisper', results)
+    assert whisper.started.wait(timeout=10)
+
+    # Other models and stats() stay usable while whisper is loading
+    done = threading.Event()
+    def use_llm():
+        with manager.use('llm'):
+            manager.stats()
+        done.set()
+    threading.Thread(target=use_llm, daemon=True).start()
+    assert done.wait(timeout=2)
+    assert manager.stats()['models']['whisper']['loading']
+
+    whisper.release.set()
+    loading.join(timeout=10)
+    assert results == ['whisper']
+
+def test_concurrent_users_share_one_load():
+    manager = ModelManager()
+    whisper = SlowLoader('whisper')
+    manager.register('whisper', whisper, 0)
+
+    results = []
+    first = use_in_thread(manager, 'whisper', results)
+    assert whisper.started.wait(timeout=10)
+    second = use_in_thread(manager, 'whisper', results)
+
+    whisper.release.set()
+    first.join(timeout=10)
+    second.join(timeout=10)
+    assert results == ['whisper', 'whisper']
+    assert whisper.calls == 1
+    assert manager.stats()['models']['whisper']['loads'] == 1
+
+def test_failed_load_is_retried():
+    manager = ModelManager()
+    attempts = []
+    def loader():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RuntimeError("download failed")
+        return 'whisper'
+    manager.register('whisper', loader, 0)
+
+    try:
+        with manager.use('whisper'):
+            pass
+        assert False, "expected RuntimeError"
+    except RuntimeError:
+        pass
+
+    with manager.use('whisper') as instance:
+        assert instance == 'whisper'
+    model = manager.models['whisper']
+    assert not model.loading
+    assert model.in_use == 0
+
+if __name__ == '__main__':
+    tests = [(name, fn) for name, fn in list(globals().items()) if name.startswith('test_')]
+    failed = 0
+    for name, fn in tests:
+        try:
+            fn()
+            print(f"PASSED {name}")
+        except Exception as e:
+            failed += 1
+            print(f"FAILED {name}: {e!r}")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,212 @@
+import os
+import sys
+import tempfile
+import contextlib
+from datetime import datetime, timedelta
+
+# Tests for the database-backed task queue (claim_task / renew_lease) on a
+# fresh SQLite file per test.
+#
+# Usage: python test_task_queue.py  (or collect with pytest)
+
+def make_app():
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'queue.db')}"
+    from worker import create_worker_app
+    from extensions import db
+    from models import User
+
+    app = create_worker_app()
+    with app.app_context():
+        user = User(username='queue')
+        user.set_password('queue')
+        db.session.add(user)
+        db.session.commit()
+        app.config['TEST_USER_ID'] = user.id
+    return app
+
+def add_tasks(app, count):
+    import services
+    with app.app_context():
+        return [services.add_task(f"audio_{i}.wav", app.config['TEST_USER_ID']) for i in range(count)]
+
+def task_row(task_id):
+    from extensions import db
+    from models import TranscriptionTask
+    db.session.expire_all()
+    return TranscriptionTask.query.get(task_id)
+
+def expire_lease(task_id):
+    import services
+    from extensions import db
+    from models import TranscriptionTask
+    TranscriptionTask.query.filter_by(id=task_id).update(
+        {'lease_expires_at': services.database_now() - timedelta(seconds=1)}, synchronize_session=False
+    )
+    db.session.commit()
+
+@contextlib.contextmanager
+def patched(module, **values):
+    saved = {name: getattr(module, name) for name in values}
+    for name, value in values.items():
+        setattr(module, name, value)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            setattr(module, name, value)
+
+def test_live_lease_is_not_reclaimed():
+    import services
+
+    app = make_app()
+    task_id, = add_tasks(app, 1)
+    with app.app_context():
+        assert services.claim_task('worker-a').id == task_id
+        assert services.claim_task('worker-b') is None
+        assert services.renew_lease(task_id, 'worker-a')
+        assert not services.renew_lease(task_id, 'worker-b')
+        assert task_row(task_id).worker_id == 'worker-a'
+
+def test_expired_lease_is_reclaimed():
+    import services
+
+    app = make_app()
+    task_id, = add_tasks(app, 1)
+    with app.app_context():
+        services.claim_task('worker-a')
+        expire_lease(task_id)
+
+        task = services.claim_task('worker-b')
+        assert task.id == task_id
+        assert task.worker_id == 'worker-b'
+        assert task.attempts == 2
+        # The old holder can no longer renew or report progress
+        assert not services.renew_lease(task_id, 'worker-a')
+        services.update_task_status(task_id, "processing", 50, "stale", worker_id='worker-a')
+        assert task_row(task_id).message != "stale"
+
+def test_max_attempts_fails_task():
+    import services
+
+    app = make_app()
+    task_id, = add_tasks(app, 1)
+    with app.app_context(), patched(services, MAX_ATTEMPTS=2):
+        services.claim_task('worker-a')
+        expire_lease(task_id)
+        services.claim_task('worker-b')
+        expire_lease(task_id)
+
+        assert services.claim_task('worker-c') is None
+        task = task_row(task_id)
+        assert task.status == 'failed'
+        assert task.attempts == 2
+        assert task.error
+
+def test_lease_uses_database_clock():
+    # A worker host whose clock runs an hour ahead must not shorten or
+    # stretch the lease
+    import services
+
+    class SkewedDatetime(datetime):
+        @classmethod
+        def utcnow(cls):
+            return datetime.utcnow() + timedelta(hours=1)
+
+    app = make_app()
+    task_id, = add_tasks(app, 1)
+    with app.app_context(), patched(services, datetime=SkewedDatetime):
+        task = services.claim_task('worker-a')
+        remaining = (task.lease_expires_at - datetime.utcnow()).total_seconds()
+        assert services.LEASE_SECONDS - 5 < remaining <= services.LEASE_SECONDS + 1
+
+def test_worker_abandons_task_after_losing_lease():
+    import services
+    from models import Transcript
+
+    app = make_app()
+    task_id, = add_tasks(app, 1)
+    audio_path = os.path.join(tempfile.mkdtemp(), 'audio_0.wav')
+    open(audio_path, 'wb').close()
+
+    with app.app_context():
+        services.claim_task('worker-a')
+        expire_lease(task_id)
+        services.claim_task('worker-b')
+
+        worker = services.BackgroundWorker(app, worker_id='worker-a')
+        with patched(
+            services,
+            DIARIZATION_ENABLED=False,
+            transcribe_segments=lambda path: [{'start': 0.0, 'end': 1.0, 'text': 'halo'}],
+            format_dialogue_chunked=lambda text, task_id, labeled=False, worker_id=None: text,
+            extract_metadata_from_transcript=lambda text: {}
+        ):
+            worker.process_task(task_id, audio_path)
+
+        task = task_row(task_id)
+        assert task.status == 'processing'
+        assert task.worker_id == 'worker-b'
+        assert task.result_id is None
+        assert Transcript.query.count() == 0
+        # The audio still belongs to the new holder
+        assert os.path.exists(audio_path)
+
+def test_heartbeat_notices_lost_lease():
+    import services
+
+    app = make_app()
+    task_id, = add_tasks(app, 1)
+    with app.app_context():
+        services.claim_task('worker-a')
+        expire_lease(task_id)
+        services.claim_task('worker-b')
+
+    with patched(services, HEARTBEAT_SECONDS=0.01):
+        heartbeat = services.LeaseHeartbeat(app, task_id, 'worker-a')
+        heartbeat.start()
+        heartbeat.join(timeout=5)
+
+    assert heartbeat.lost
+    worker = services.BackgroundWorker(app, worker_id='worker-a')
+    worker.heartbeat = heartbeat
+    try:
+        worker.check_lease()
+        assert False, "expected LeaseLost"
+    except services.LeaseLost:
+        pass
+
+def test_legacy_processing_rows_are_reclaimed():
+    # Rows stuck in 'processing' by the old in-memory queue have NULL leases
+    import services
+    from extensions import db
+    from models import TranscriptionTask
+
+    app = make_app()
+    stuck, exhausted = add_tasks(app, 2)
+    with app.app_context():
+        TranscriptionTask.query.filter(TranscriptionTask.id.in_([stuck, exhausted])).update({
+            'status': 'processing', 'worker_id': None, 'lease_expires_at': None, 'attempts': None
+        }, synchronize_session=False)
+        TranscriptionTask.query.filter_by(id=exhausted).update(
+            {'attempts': services.MAX_ATTEMPTS}, synchronize_session=False
+        )
+        db.session.commit()
+
+        task = services.claim_task('worker-a')
+        assert task.id == stuck
+        assert task.worker_id == 'worker-a'
+        assert task.lease_expires_at is not None
+        assert task_row(exhausted).status == 'failed'
+        assert services.claim_task('worker-b') is None
+
+if __name__ == '__main__':
+    tests = [(name, fn) for name, fn in list(globals().items()) if name.startswith('test_')]
+    failed = 0
+    for name, fn in tests:
+        try:
+            fn()
+            print(f"PASSED {name}")
+        except Exception as e:
+            failed += 1
+            print(f"FAILED {name}: {e!r}")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,38 @@
+import os
+from flask import Flask
+from dotenv import load_dotenv
+from extensions import db, configure_database
+from models import upgrade_schema
+
+load_dotenv()
+
+# Standalone worker: processes TranscriptionTask rows without the web app.
+# Point DATABASE_URL and UPLOAD_FOLDER at the same database and audio store
+# as the web app, then run `python worker.py` on as many hosts as needed.
+
+def create_worker_app():
+    app = Flask(__name__)
+    app.config['UPLOAD_FOLDER'] = os.getenv('UPLOAD_FOLDER', os.path.join('static', 'uploads'))
+    
+    configure_database(app)
+    
+    with app.app_context():
+        db.create_all()
+        upgrade_schema()
+        
+    return app
+
+if __name__ == '__main__':
+    from services import BackgroundWorker, WORKER_THREADS
+    
+    app = create_worker_app()
+    # Extra threads share this process's models (see LLM_BATCH_SIZE)
+    for _ in range(WORKER_THREADS - 1):
+        BackgroundWorker(app).start()
+    
+    worker = BackgroundWorker(app)
+    try:
+        # Run in the main thread
+        worker.run()
+    except KeyboardInterrupt:
+        print("Worker stopped.")